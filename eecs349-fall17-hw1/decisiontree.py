@@ -1,84 +1,337 @@
 import io, sys, os
 import csv
 import math
+import mmap
+import struct
 import random
+import time
+import itertools
+import operator
+import multiprocessing
+import StringIO
+import numpy as np
 
 
 def main():
-	if len(sys.argv) != 5:
-		print "Command should follow format: python decisiontree.py <inputFileName> <trainingSetSize> <numberOfTrials> <verbose>"
+	# Train a tree on every example of a file and save it, or classify the examples of a file with a saved tree
+	if len(sys.argv) == 4 and sys.argv[1] == "train":
+		train_model(sys.argv[2], sys.argv[3])
+		return
+	if len(sys.argv) == 4 and sys.argv[1] == "classify":
+		classify_with_model(sys.argv[2], sys.argv[3])
+		return
+	# Evaluate several training set sizes in one run, for a learning curve
+	if len(sys.argv) >= 5 and sys.argv[1] == "curve":
+		options = parse_options(sys.argv[5:], TRIAL_FLAGS)
+		sizes = parse_sizes(sys.argv[3])
+		if options == None or sizes == None or not sys.argv[4].isdigit():
+			print "Command should follow format: python decisiontree.py curve <inputFileName> <trainingSetSize>,<trainingSetSize>,... <numberOfTrials> [--workers <numberOfProcesses>] [--seed <masterSeed>]"
+			sys.exit(1)
+		learning_curve(sys.argv[2], sizes, int(sys.argv[4]), options)
+		return
+	# Learn a Hoeffding tree from the examples one at a time, instead of loading them all and running trials
+	if len(sys.argv) >= 3 and sys.argv[1] == "stream":
+		options = parse_options(sys.argv[3:], STREAM_FLAGS)
+		if options == None:
+			print "Command should follow format: python decisiontree.py stream <inputFileName> [--delta <confidence>] [--grace-period <numberOfExamples>] [--tie-threshold <gain>] [--report-every <numberOfExamples>] [--save-model <modelFileName>]"
+			sys.exit(1)
+		stream_learn(sys.argv[2], options)
+		return
+	options = parse_options(sys.argv[5:], TRIAL_FLAGS)
+	if len(sys.argv) < 5 or options == None:
+		print "Command should follow format: python decisiontree.py <inputFileName> <trainingSetSize> <numberOfTrials> <verbose> [--workers <numberOfProcesses>] [--seed <masterSeed>]"
+		print "or, to learn a Hoeffding tree from a stream of examples: python decisiontree.py stream <inputFileName> [--delta <confidence>] [--grace-period <numberOfExamples>] [--tie-threshold <gain>] [--report-every <numberOfExamples>] [--save-model <modelFileName>]"
+		print "or, to evaluate several training set sizes: python decisiontree.py curve <inputFileName> <trainingSetSize>,<trainingSetSize>,... <numberOfTrials> [--workers <numberOfProcesses>] [--seed <masterSeed>]"
+		print "or, to train a tree on every example and save it: python decisiontree.py train <inputFileName> <modelFileName>"
+		print "or, to classify examples with a saved tree: python decisiontree.py classify <modelFileName> <inputFileName>"
 		sys.exit(1)
 	inputFileName = sys.argv[1]
 	trainingSetSize = int(sys.argv[2])
 	numberOfTrials = int(sys.argv[3])
 	verbose = int(sys.argv[4])
+	if options["seed"] == None:
+		options["seed"] = random.randrange(2**31)
 
 	# Read the data and get the attributes and examples
 	examples = read_data(inputFileName)
 	attribute_names = examples[0]
 	examples = examples[1:len(examples)]
-	attribute_indices = range(len(attribute_names) - 1)
-	class_idx = len(attribute_names) - 1
 
 	# Create decision trees, classify data, and print output numberOfTrials times
+	# Each trial gets its own seed drawn from the master seed, so the splits (and results) are the same however the trials are spread over processes
+	seeds = trial_seeds(options["seed"], numberOfTrials)
+	trials = [(trialNumber, seeds[trialNumber], trainingSetSize, verbose) for trialNumber in range(numberOfTrials)]
+	pool = None
+	if options["workers"] > 1:
+		pool = multiprocessing.Pool(options["workers"], init_trial_worker, (examples, attribute_names))
+		trial_results = pool.imap(run_trial, trials)
+	else:
+		init_trial_worker(examples, attribute_names)
+		trial_results = itertools.imap(run_trial, trials)
 	ID3_results = []
 	PP_results = []
-	for trialNumber in range(numberOfTrials):
+	trial_times = []
+	# Trials come back in order, so their output is printed in the same order whatever the number of workers
+	for output, p_correct_ID3, p_correct_PP, tested, elapsed in trial_results:
+		sys.stdout.write(output)
+		if tested:
+			ID3_results.append(p_correct_ID3)
+			PP_results.append(p_correct_PP)
+		trial_times.append(elapsed)
+	if pool != None:
+		pool.close()
+		pool.join()
+
+	testingSetSize = len(examples) - trainingSetSize
+	summary_output(inputFileName, trainingSetSize, testingSetSize, numberOfTrials, ID3_results, PP_results, trial_times, options["seed"])
+
+# The optional flags each mode takes: normal runs and learning curves run trials, and stream mode learns a Hoeffding tree
+TRIAL_FLAGS = ["--workers", "--seed"]
+STREAM_FLAGS = ["--delta", "--grace-period", "--tie-threshold", "--report-every", "--save-model"]
+
+# Function that reads the optional flags that follow the required arguments of a mode, which can only be the flags in mode_flags
+# Returns None if a flag isn't recognized, belongs to another mode, or is missing its value, so main can print the usage message
+def parse_options(args, mode_flags):
+	options = {"workers": 1, "seed": None, "delta": 1e-7, "grace_period": 200, "tie_threshold": 0.05, "report_every": 10000, "save_model": None}
+	i = 0
+	while i < len(args):
+		if args[i] not in mode_flags:
+			return None
+		elif args[i] == "--workers" and i + 1 < len(args) and args[i+1].isdigit() and int(args[i+1]) > 0:
+			options["workers"] = int(args[i+1])
+			i += 1
+		elif args[i] == "--seed" and i + 1 < len(args) and args[i+1].isdigit():
+			options["seed"] = int(args[i+1])
+			i += 1
+		elif args[i] in ["--delta", "--tie-threshold"] and i + 1 < len(args):
+			try:
+				options[args[i][2:].replace("-", "_")] = float(args[i+1])
+			except ValueError:
+				return None
+			i += 1
+		elif args[i] in ["--grace-period", "--report-every"] and i + 1 < len(args) and args[i+1].isdigit() and int(args[i+1]) > 0:
+			options[args[i][2:].replace("-", "_")] = int(args[i+1])
+			i += 1
+		elif args[i] == "--save-model" and i + 1 < len(args):
+			options["save_model"] = args[i+1]
+			i += 1
+		else:
+			return None
+		i += 1
+	# The Hoeffding bound needs a confidence strictly between 0 and 1, and a tie threshold can't be negative
+	if not 0 < options["delta"] < 1 or not options["tie_threshold"] >= 0:
+		return None
+	return options
+
+# Function that derives one seed per trial from the master seed
+def trial_seeds(master_seed, numberOfTrials):
+	master = random.Random(master_seed)
+	return [master.randrange(2**31) for trialNumber in range(numberOfTrials)]
+
+# Examples and attribute names used by run_trial, set up once per worker process (or once in main when there is only one)
+# If every value is true or false there are no thresholds or categories to fit, so the examples are encoded once into trial_matrix
+# (and trial_features) and every trial trains and tests on rows of it. Otherwise trial_matrix is None, and each trial fits its
+# own on its training examples (see train_and_test)
+trial_examples = None
+trial_attribute_names = None
+trial_matrix = None
+trial_features = None
+
+def init_trial_worker(examples, attribute_names):
+	global trial_examples, trial_attribute_names, trial_matrix, trial_features
+	trial_examples = examples
+	trial_attribute_names = attribute_names
+	trial_matrix = boolean_example_matrix(examples, len(attribute_names))
+	if trial_matrix != None:
+		trial_features = trial_matrix.features()
+
+# Function that splits the numbers of example_count examples with a random permutation: its first trainingSetSize entries are the
+# training rows (in that order), and every other row is a test row (in file order). Returns both as arrays of row numbers
+def split_rows(example_count, trainingSetSize, rng):
+	if trainingSetSize > example_count:
+		raise ValueError("sample larger than population")
+	permutation = range(example_count)
+	rng.shuffle(permutation)
+	permutation = np.array(permutation, dtype=np.intp)
+	return permutation[:trainingSetSize], np.sort(permutation[trainingSetSize:])
+
+# Function that generates an ID3 decision tree from the training rows of the examples and classifies the test rows with it
+# The numeric thresholds and the categories come from the training rows alone: unless the examples were already encoded into
+# shared_matrix (only true/false values, so nothing to fit), the training rows are encoded into their own ExampleMatrix and the
+# test rows are encoded with example_features, using its numeric columns and categories
+# Returns the tree, the most common classification of the training rows (true if there is a tie, as in Mode), the ID3
+# classification of each test row, and the actual classification of each test row
+def train_and_test(examples, shared_matrix, shared_features, training_rows, test_rows, attribute_indices, class_idx):
+	if shared_matrix != None:
+		# The tree is built straight from the training rows of the shared matrix
+		training_matrix = shared_matrix
+		matrix_rows = training_rows
+		training_classes = shared_matrix.values[training_rows, class_idx]
+		test_features = shared_features[test_rows]
+		test_classes = shared_matrix.values[test_rows, class_idx]
+	else:
+		training_matrix = ExampleMatrix([examples[row] for row in training_rows], class_idx + 1)
+		matrix_rows = None
+		training_classes = training_matrix.values[:, class_idx]
+		test_examples = [examples[row] for row in test_rows]
+		test_features = example_features(test_examples, class_idx + 1, training_matrix.numeric.keys(), training_matrix.categories)
+		test_classes = np.array([example[class_idx] == True for example in test_examples], dtype=bool)
+	training_true_count = int(np.count_nonzero(training_classes))
+	mode = training_true_count >= len(training_rows) - training_true_count
+	decision_tree = ID3_levelwise(training_matrix, attribute_indices, mode, class_idx, mode, training_rows=matrix_rows)
+	ID3_classifications = predict_batch(flatten_tree(decision_tree, training_matrix.categories), test_features)
+	return decision_tree, mode, ID3_classifications, test_classes
+
+# Function that runs one train/test trial. What it prints is collected and returned rather than printed, so main can print the trials in order
+# Returns the output, the fraction of test cases classified correctly by ID3 and by prior probability, whether there were any test cases,
+# and how many seconds the trial took
+def run_trial(trial):
+	trialNumber, seed, trainingSetSize, verbose = trial
+	start = time.time()
+	output = StringIO.StringIO()
+	stdout = sys.stdout
+	sys.stdout = output
+	try:
+		examples = trial_examples
+		attribute_names = trial_attribute_names
+		attribute_indices = range(len(attribute_names) - 1)
+		class_idx = len(attribute_names) - 1
 		print "\n" + "--------------------"
 		print "Trial number %d" % trialNumber
 		print "--------------------"
 		# Split the examples into training and test data
-		rand_indices = random.sample(xrange(len(examples)), trainingSetSize)
-		training_examples = []
-		test_examples = []
-		for idx in rand_indices:
-			training_examples.append(examples[idx])
-		for i in range(len(examples)):
-			if i not in rand_indices:
-				test_examples.append(examples[i])
-
-		# Generate the ID3 decision tree from the training data
-		mode = Mode(training_examples, len(attribute_names) - 1)
-		decision_tree = ID3Tree()
-		decision_tree = ID3(training_examples, attribute_indices, mode, class_idx, mode)
-		print_tree(decision_tree, attribute_names, None, 0, None)
-		# Now that we have the tree, use it to classify the test data
+		training_rows, test_rows = split_rows(len(examples), trainingSetSize, random.Random(seed))
+
+		# Generate the ID3 decision tree from the training rows, and use it to classify the test rows
 		# Also classify the data using prior probability -> because data is binary, just assign all examples the most common classification (i.e., the mode)
 		# But rather than actually classifying, we can just see whether the mode matches the actual classification for each example and count the number that match
+		decision_tree, mode, ID3_classifications, test_classes = train_and_test(examples, trial_matrix, trial_features, training_rows, test_rows, attribute_indices, class_idx)
+		print_tree(decision_tree, attribute_names, None, 0, None)
 		classified_examples = []
-		correct_classifications_ID3 = 0
-		correct_classifications_PP = 0
-		if len(test_examples) == 0:
+		if len(test_rows) == 0:
 			p_correct_ID3 = 0
 			p_correct_PP = 0
 			print "There are no testing examples."
 		else:
-			for test_ex in test_examples:
-				# classify using ID3
-				classified_ex = test_ex
-				ID3_classification = classify_testingData(decision_tree, test_ex)
-				# See if we got the classification correct
-				if ID3_classification == test_ex[class_idx]:
-					correct_classifications_ID3 += 1
-				classified_ex.append(ID3_classification)
-				# classify using prior probability
-				if mode == test_ex[class_idx]:
-					correct_classifications_PP += 1
-				classified_ex.append(mode)
-				classified_examples.append(classified_ex)
-			p_correct_ID3 = float(correct_classifications_ID3) / float(len(test_examples))
-			ID3_results.append(p_correct_ID3)
-			p_correct_PP = float(correct_classifications_PP) / float(len(test_examples))
-			PP_results.append(p_correct_PP)
+			# See how many we got correct, using ID3 and using prior probability
+			correct_classifications_ID3 = int(np.count_nonzero(ID3_classifications == test_classes))
+			correct_classifications_PP = int(np.count_nonzero(test_classes == mode))
+			p_correct_ID3 = float(correct_classifications_ID3) / float(len(test_rows))
+			p_correct_PP = float(correct_classifications_PP) / float(len(test_rows))
+			if verbose == 1:
+				for i in range(len(test_rows)):
+					# copy the example, so the classifications added here don't end up in the examples used by later trials
+					classified_ex = list(examples[test_rows[i]])
+					classified_ex.append(bool(ID3_classifications[i]))
+					classified_ex.append(mode)
+					classified_examples.append(classified_ex)
 		# Print out the output
 		if verbose == 1:
-			print_verbose(attribute_names, training_examples, classified_examples)
+			print_verbose(attribute_names, [examples[row] for row in training_rows], classified_examples)
 		print "\n" + "Performance:"
 		print "	Percent of test cases correctly classified using prior probability = %.0f%%" % (100 * p_correct_PP)
 		print "	Percent of test cases correctly classified by a decision tree built with ID3 = %.0f%%" % (100 * p_correct_ID3)
-	
-	testingSetSize = len(examples) - trainingSetSize
-	summary_output(inputFileName, trainingSetSize, testingSetSize, numberOfTrials, ID3_results, PP_results)
+	finally:
+		sys.stdout = stdout
+	return output.getvalue(), p_correct_ID3, p_correct_PP, len(test_rows) > 0, time.time() - start
+
+# Function that reads a comma-separated list of training set sizes. Returns them sorted, or None if one isn't a number
+def parse_sizes(arg):
+	sizes = arg.split(",")
+	for size in sizes:
+		if not size.isdigit():
+			return None
+	return sorted(set([int(size) for size in sizes]))
+
+# Examples used by run_curve_trial, set up once per worker process (or once in learning_curve when there is only one)
+# As with trial_matrix, curve_matrix (and curve_features) holds the examples encoded once if every value is true or false, and is None otherwise
+curve_examples = None
+curve_matrix = None
+curve_features = None
+
+def init_curve_worker(examples, class_idx):
+	global curve_examples, curve_matrix, curve_features
+	curve_examples = examples
+	curve_matrix = boolean_example_matrix(examples, class_idx + 1)
+	if curve_matrix != None:
+		curve_features = curve_matrix.features()
+
+# Function that runs one trial of a learning curve: one permutation of the examples, whose first size entries are the training
+# examples for each size (so the training sets are nested) and every other example is a test example, as in split_rows
+# Each tree is built and tested with train_and_test, so its thresholds and categories come from its own training examples
+# Returns the fraction of test cases classified correctly by ID3 and by prior probability for each size (None if there were no test cases)
+def run_curve_trial(trial):
+	seed, sizes, class_idx = trial
+	permutation = range(len(curve_examples))
+	random.Random(seed).shuffle(permutation)
+	permutation = np.array(permutation, dtype=np.intp)
+	results = []
+	for size in sizes:
+		training_rows = permutation[:size]
+		test_rows = np.sort(permutation[size:])
+		# ID3 prints a note whenever no attribute gains any information, which would get in the way of the table
+		stdout = sys.stdout
+		sys.stdout = StringIO.StringIO()
+		try:
+			decision_tree, mode, ID3_classifications, test_classes = train_and_test(curve_examples, curve_matrix, curve_features, training_rows, test_rows, range(class_idx), class_idx)
+		finally:
+			sys.stdout = stdout
+		if len(test_rows) == 0:
+			results.append((None, None))
+			continue
+		p_correct_ID3 = float(np.count_nonzero(ID3_classifications == test_classes)) / len(test_rows)
+		p_correct_PP = float(np.count_nonzero(test_classes == mode)) / len(test_rows)
+		results.append((p_correct_ID3, p_correct_PP))
+	return results
+
+# Function that evaluates every training set size numberOfTrials times and prints a table of the mean and standard deviation
+# of the accuracy of ID3 and of prior probability at each size
+# The trials use the same seeds as a normal run, so the row for a size matches running decisiontree.py with that training set size,
+# number of trials and --seed
+def learning_curve(inputFileName, sizes, numberOfTrials, options):
+	if options["seed"] == None:
+		options["seed"] = random.randrange(2**31)
+	start = time.time()
+	examples = read_data(inputFileName)
+	attribute_names = examples[0]
+	examples = examples[1:len(examples)]
+	class_idx = len(attribute_names) - 1
+	if sizes[-1] > len(examples):
+		print "The training set size %d is bigger than the %d examples in %s" % (sizes[-1], len(examples), inputFileName)
+		sys.exit(1)
+	trials = [(seed, sizes, class_idx) for seed in trial_seeds(options["seed"], numberOfTrials)]
+	pool = None
+	if options["workers"] > 1:
+		pool = multiprocessing.Pool(options["workers"], init_curve_worker, (examples, class_idx))
+		trial_results = pool.map(run_curve_trial, trials)
+		pool.close()
+		pool.join()
+	else:
+		init_curve_worker(examples, class_idx)
+		trial_results = map(run_curve_trial, trials)
+
+	print "------------------------------------------------------------------------------"
+	print "Learning curve:"
+	print "file used = %s" % inputFileName
+	print "number of trials = %d" % numberOfTrials
+	print "master seed = %d (pass --seed %d to repeat these trials)" % (options["seed"], options["seed"])
+	print "training set size	testing set size	ID3 mean	ID3 stdev	prior probability mean	prior probability stdev"
+	for i in range(len(sizes)):
+		ID3_results = [results[i][0] for results in trial_results if results[i][0] != None]
+		PP_results = [results[i][1] for results in trial_results if results[i][1] != None]
+		if len(ID3_results) == 0:
+			print "%d	%d	-	-	-	-" % (sizes[i], len(examples) - sizes[i])
+		else:
+			print "%d	%d	%.1f%%	%.1f%%	%.1f%%	%.1f%%" % (sizes[i], len(examples) - sizes[i], 100 * np.mean(ID3_results), 100 * sample_stdev(ID3_results),
+													  100 * np.mean(PP_results), 100 * sample_stdev(PP_results))
+	print "total time = %.3f seconds" % (time.time() - start)
+	print "------------------------------------------------------------------------------ \n"
+
+# Function that returns the sample standard deviation of a list of numbers (0 if there is only one)
+def sample_stdev(values):
+	if len(values) < 2:
+		return 0.0
+	return float(np.std(values, ddof=1))
 
 #### Class used to represent ID3 tree
 # We are only creating a binary tree learner, so any tree/subtree will only need information on the attribute it represents and it's true/false children
@@ -86,14 +339,23 @@ class ID3Tree:
 	def __init__(self):
 		# attribute field is stored as an index number used to access the attribute name from the attributes array
 		self.attribute = None
+		# threshold is None for a true/false attribute. For a numeric attribute, examples with a value above it go down the true branch
+		self.threshold = None
+		# category is None unless the attribute is categorical, in which case examples with exactly that value go down the true branch
+		self.category = None
 		self.trueChild = None
 		self.falseChild = None
 
 ############ Helper functions ############
-# Function that reads the input file and converts "true/false" strings to booleans
+# Function that reads the input file and converts "true/false" strings to booleans, and numbers to floats
 def read_data(inputFile):
+	return list(iter_data(inputFile))
+
+# Function that reads the input file one row at a time, yielding each row (the attribute names first) as read_data would convert it
+# Only the current row is in memory, so files too big to load can be streamed through the Hoeffding tree learner
+def iter_data(inputFile):
 	f = open(inputFile, 'r')
-	examples = []
+	header = True
 	# Create the reader object
 	reader = csv.reader(f, delimiter='	')
 	for row in reader:
@@ -104,8 +366,14 @@ def read_data(inputFile):
 				temp_row[i] = True
 			elif "alse" in temp_row[i]: # Same idea for false
 				temp_row[i] = False
-		examples.append(temp_row)
-	return examples
+			elif not header: # the first row holds the attribute names, which stay strings
+				try:
+					temp_row[i] = float(temp_row[i])
+				except ValueError:
+					pass
+		header = False
+		yield temp_row
+	f.close()
 
 # Function to find the most common example
 def Mode(examples, class_idx):
@@ -119,85 +387,868 @@ def Mode(examples, class_idx):
 	else:
 		return False
 
+#### Class used to store a set of examples as a 2-D NumPy boolean matrix, with one row per example and one column per attribute (and the class)
+# Each column is also packed into a bitset of uint64 words (bits[column], see column_bitsets), with bit i set when example i is true
+# While a tree is built, node_of[i] says which open node of the current level example i is at (-1 once its node is closed),
+# and the counts every open node needs for every attribute are gathered together in one pass over the matrix (see level_counts).
+# Only a node holding at least bitset_share of the examples has its true/false columns counted with popcounts of ANDed bitsets;
+# the smaller nodes, which are most of them below the first few levels, are counted by adding up runs of their rows (see add_runs)
+# How a column is split on depends on the values it holds, leaving out missing ones (see column_kind).
+# Numeric columns are each split into at most max_bins quantile bins once, up front: thresholds[column] holds the bin edges
+# (values from the column), and an example is in bin b when thresholds[b-1] < value <= thresholds[b]. A missing value is placed
+# the way classify_testingData compares it (see numeric_value), so "?" (or any other text, such as "N/A") ends up in the top bin.
+# Splitting on "value > thresholds[t]" then sends the examples in bins above t down the true branch, so a node only needs
+# a class histogram over the bins to score every threshold, and the examples never have to be sorted again
+# Categorical (text) columns are split on one value against the rest: categories[column] holds the (at most max_bins most common)
+# values, and codes[column] the category number of every example, so a node scores every value from a histogram over the categories
+class ExampleMatrix:
+	def __init__(self, examples, column_count, max_bins=32):
+		self.numeric = {} # column -> float array of its values, for numeric columns only
+		self.thresholds = {}
+		self.bins = {} # column -> bin number of every example
+		self.categories = {} # column -> the values it is split on, for categorical columns only
+		self.codes = {} # column -> category number of every example (-1 if its value is missing or not one of the categories)
+		self.values = boolean_matrix(examples, column_count)
+		if self.values is not None: # (an array can't be compared to None with ==)
+			self.bits = column_bitsets(self.values)
+			return
+		# Otherwise the examples are encoded one column at a time, each column being converted to an array in one go
+		self.values = np.zeros((len(examples), column_count), dtype=bool)
+		for column in range(column_count):
+			column_values = map(operator.itemgetter(column), examples)
+			# Most columns only hold true/false values, and those need no more checks
+			if set(map(type, column_values)) <= set([bool]):
+				self.values[:, column] = np.fromiter(column_values, dtype=bool, count=len(column_values))
+				continue
+			kind = column_kind(column_values)
+			if kind == "numeric":
+				values = numeric_values(column_values)
+				# (a number is only == True if it is 1)
+				self.values[:, column] = values == 1
+				self.numeric[column] = values
+				self.thresholds[column] = quantile_thresholds(values, max_bins)
+				self.bins[column] = np.searchsorted(self.thresholds[column], values, side='left')
+			elif kind == "categorical":
+				self.categories[column] = common_categories(column_values, max_bins)
+				self.codes[column] = category_codes(column_values, self.categories[column])
+			else:
+				self.values[:, column] = boolean_values(column_values)
+		self.bits = column_bitsets(self.values)
+
+	# Function that returns the examples as a matrix predict_batch can compare against thresholds: the boolean matrix itself
+	# if there are no numeric or categorical columns, otherwise a float matrix with 1.0/0.0 for true/false, the values of the
+	# numeric columns and the category numbers of the categorical columns
+	def features(self):
+		if len(self.numeric) == 0 and len(self.categories) == 0:
+			return self.values
+		features = self.values.astype(float)
+		for column, values in self.numeric.iteritems():
+			features[:, column] = values
+		for column, codes in self.codes.iteritems():
+			features[:, column] = codes
+		return features
+
+	# Function that goes through the examples block_size rows at a time and counts, for each of the node_count open nodes
+	# numbered first_node and up (the examples at other nodes are skipped):
+	#  - example_counts[k]: how many examples are at node k
+	#  - true_counts[k][c] and true_class_counts[k][c]: how many of those have column c true, and how many of those are also classified true
+	#  - split_counts[c][k][t] and split_class_counts[c][k][t]: how many go down the true branch of split t of a numeric or categorical
+	#    column c, and how many of those are classified true. For a numeric column that is being above threshold t (from a class
+	#    histogram over the bins, summed from the top), and for a categorical column having category t
+	# The true/false columns of a node holding at least bitset_share of the examples are counted with popcounts of its mask ANDed
+	# with the column bitsets (see bitset_counts), which costs the same whatever the size of the node. For the other nodes, the
+	# examples of each block are sorted by node and the true/false columns are added up one run of a node's rows at a time (see add_runs),
+	# which costs as much as the node's rows, and the bins are bincounts keyed by node number and bin, so all of the nodes share the same pass
+	# The counts come back as NumPy arrays with one row per node, row k being node first_node + k
+	def level_counts(self, node_of, first_node, node_count, class_idx, block_size=65536, bitset_share=0.4):
+		column_count = self.values.shape[1]
+		at_nodes = (node_of >= first_node) & (node_of < first_node + node_count)
+		example_counts = np.bincount(node_of[at_nodes] - first_node, minlength=node_count).astype(np.int64)
+		true_counts = np.zeros((node_count, column_count), dtype=np.int64)
+		true_class_counts = np.zeros((node_count, column_count), dtype=np.int64)
+		counted = example_counts >= max(1, bitset_share * len(node_of))
+		for k in np.flatnonzero(counted):
+			true_counts[k], true_class_counts[k] = self.bitset_counts(row_bitset(node_of == first_node + k), class_idx)
+		bin_counts = {}
+		bin_class_counts = {}
+		for column in self.numeric:
+			bin_counts[column] = np.zeros(node_count * (len(self.thresholds[column]) + 1), dtype=np.int64)
+			bin_class_counts[column] = np.zeros(node_count * (len(self.thresholds[column]) + 1), dtype=np.int64)
+		for column in self.categories:
+			# One more slot in front of the categories for the examples that aren't in any of them
+			bin_counts[column] = np.zeros(node_count * (len(self.categories[column]) + 1), dtype=np.int64)
+			bin_class_counts[column] = np.zeros(node_count * (len(self.categories[column]) + 1), dtype=np.int64)
+		for start in range(0, len(node_of), block_size):
+			nodes = node_of[start:start + block_size] - first_node
+			# The block's examples at these nodes, sorted by node so the examples at each node are one run of rows
+			rows = np.flatnonzero((nodes >= 0) & (nodes < node_count))
+			rows = start + rows[np.argsort(nodes[rows], kind='mergesort')]
+			nodes = nodes[rows - start]
+			classes = self.values[rows, class_idx]
+			# (the rows stay sorted by node when the ones at nodes counted with bitsets are left out)
+			run_rows = ~counted[nodes]
+			block = self.values[rows[run_rows]]
+			run_classes = classes[run_rows]
+			add_runs(true_counts, nodes[run_rows], block)
+			add_runs(true_class_counts, nodes[run_rows][run_classes], block[run_classes])
+			for column in self.numeric:
+				keys = nodes * (len(self.thresholds[column]) + 1) + self.bins[column][rows]
+				bin_counts[column] += np.bincount(keys, minlength=len(bin_counts[column]))
+				bin_class_counts[column] += np.bincount(keys[classes], minlength=len(bin_counts[column]))
+			for column in self.categories:
+				keys = nodes * (len(self.categories[column]) + 1) + self.codes[column][rows] + 1
+				bin_counts[column] += np.bincount(keys, minlength=len(bin_counts[column]))
+				bin_class_counts[column] += np.bincount(keys[classes], minlength=len(bin_counts[column]))
+		split_counts = {}
+		split_class_counts = {}
+		for column in self.numeric:
+			# The examples above threshold t are the ones in bins t + 1 and up
+			counts = bin_counts[column].reshape(node_count, -1)
+			class_counts = bin_class_counts[column].reshape(node_count, -1)
+			split_counts[column] = example_counts[:, np.newaxis] - np.cumsum(counts, axis=1)[:, :-1]
+			split_class_counts[column] = true_class_counts[:, class_idx][:, np.newaxis] - np.cumsum(class_counts, axis=1)[:, :-1]
+		for column in self.categories:
+			split_counts[column] = bin_counts[column].reshape(node_count, -1)[:, 1:]
+			split_class_counts[column] = bin_class_counts[column].reshape(node_count, -1)[:, 1:]
+		return example_counts, true_counts, true_class_counts, split_counts, split_class_counts
+
+	# Function that counts how many of the examples in a row bitset (see row_bitset) have each column true, and how many of those are
+	# also classified true, as popcounts of the mask ANDed with each column's bitset. The words are gone through block_words at a time
+	def bitset_counts(self, mask, class_idx, block_words=1024):
+		class_mask = mask & self.bits[class_idx]
+		true_counts = np.zeros(len(self.bits), dtype=np.int64)
+		true_class_counts = np.zeros(len(self.bits), dtype=np.int64)
+		for start in range(0, len(mask), block_words):
+			words = self.bits[:, start:start + block_words]
+			true_counts += popcounts(words & mask[start:start + block_words]).sum(axis=1)
+			true_class_counts += popcounts(words & class_mask[start:start + block_words]).sum(axis=1)
+		return true_counts, true_class_counts
+
+	# Function that moves every example at a node that was split down to its child on the next level, and closes the other nodes' examples
+	# split_columns[k] is the column node k split on (-1 if it didn't), split_bins[k] the bin number of its threshold for a numeric column
+	# or its category number for a categorical one, and true_children[k] and false_children[k] the numbers of its children among the next level's open nodes
+	def advance(self, node_of, split_columns, split_bins, true_children, false_children, block_size=65536):
+		for start in range(0, len(node_of), block_size):
+			nodes = node_of[start:start + block_size]
+			rows = np.flatnonzero(nodes >= 0)
+			columns = split_columns[nodes[rows]]
+			rows = rows[columns >= 0]
+			columns = columns[columns >= 0]
+			split_nodes = nodes[rows]
+			go_true = self.values[start + rows, columns]
+			for column in self.numeric:
+				on_column = columns == column
+				go_true[on_column] = self.bins[column][start + rows[on_column]] > split_bins[split_nodes[on_column]]
+			for column in self.categories:
+				on_column = columns == column
+				go_true[on_column] = self.codes[column][start + rows[on_column]] == split_bins[split_nodes[on_column]]
+			nodes[:] = -1
+			nodes[rows] = np.where(go_true, true_children[split_nodes], false_children[split_nodes])
+
+# Function that converts the first column_count columns of some examples to a boolean matrix, block_size examples at a time,
+# if all of their values are True or False. NumPy only makes a bool array out of a block when every value in it is a bool,
+# so nothing else has to be checked. Returns None as soon as a block holds anything else
+def boolean_matrix(examples, column_count, block_size=65536):
+	values = np.zeros((len(examples), column_count), dtype=bool)
+	for start in range(0, len(examples), block_size):
+		block = np.array(examples[start:start + block_size])
+		if block.dtype != bool or block.ndim != 2 or block.shape[1] < column_count:
+			return None
+		values[start:start + block_size] = block[:, :column_count]
+	return values
+
+# Function that returns the first column_count columns of some examples as an ExampleMatrix if all of their values are True or False,
+# or None otherwise (see boolean_matrix)
+def boolean_example_matrix(examples, column_count):
+	values = boolean_matrix(examples, column_count)
+	if values is None:
+		return None
+	example_matrix = ExampleMatrix([], column_count)
+	example_matrix.values = values
+	example_matrix.bits = column_bitsets(values)
+	return example_matrix
+
+# Function that packs each column of a boolean matrix into a bitset of uint64 words, bit i of a column's bitset being set when
+# row i is true (see row_bitset). Returns a (columns, words) array. The rows are packed block_size at a time, which has to be a multiple of 64
+def column_bitsets(values, block_size=65536):
+	packed = np.zeros((values.shape[1], -(-len(values) // 64) * 8), dtype=np.uint8)
+	for start in range(0, len(values), block_size):
+		block = values[start:start + block_size]
+		packed[:, start // 8:start // 8 + -(-len(block) // 8)] = np.packbits(block, axis=0).T
+	return packed.view(np.uint64)
+
+# Function that packs a boolean array with one entry per row into a bitset laid out like a column of column_bitsets
+def row_bitset(rows):
+	packed = np.zeros(-(-len(rows) // 64) * 8, dtype=np.uint8)
+	packed[:-(-len(rows) // 8)] = np.packbits(rows)
+	return packed.view(np.uint64)
+
+# Function that returns the number of bits set in each uint64 word of an array, adding up pairs of bits, then nibbles, then bytes
+def popcounts(words):
+	words = words - ((words >> np.uint64(1)) & np.uint64(0x5555555555555555))
+	words = (words & np.uint64(0x3333333333333333)) + ((words >> np.uint64(2)) & np.uint64(0x3333333333333333))
+	words = (words + (words >> np.uint64(4))) & np.uint64(0x0f0f0f0f0f0f0f0f)
+	return ((words * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+# Function that adds up the rows of a boolean matrix into counts, row k of counts getting the rows whose node number is k
+# The node numbers have to be sorted, so that each node's rows are one run. The rows are added up as uint64 words that each hold
+# 8 columns, one per byte, so 8 columns are counted with every addition. A byte can't carry into the next for up to 255 rows,
+# so each run is added up in pieces of at most 255 rows, and then the bytes of its pieces are added up
+def add_runs(counts, nodes, block):
+	if len(nodes) == 0:
+		return
+	column_count = block.shape[1]
+	words = np.zeros((len(nodes), -(-column_count // 8) * 8), dtype=np.uint8)
+	words[:, :column_count] = block
+	firsts = np.flatnonzero(np.concatenate([[True], nodes[1:] != nodes[:-1]]))
+	run_pieces = (np.diff(np.append(firsts, len(nodes))) + 254) // 255
+	first_pieces = np.cumsum(run_pieces) - run_pieces
+	pieces = np.repeat(firsts, run_pieces) + 255 * (np.arange(run_pieces.sum()) - np.repeat(first_pieces, run_pieces))
+	sums = np.add.reduceat(words.view(np.uint64), pieces, axis=0).view(np.uint8)[:, :column_count]
+	if len(pieces) == len(firsts):
+		counts[nodes[firsts]] += sums
+	else:
+		counts[nodes[firsts]] += np.add.reduceat(sums, first_pieces, axis=0, dtype=np.int64)
+
+# Function that checks whether a value read from a file is a number (but not True or False)
+def is_number(value):
+	return isinstance(value, (int, long, float)) and not isinstance(value, bool)
+
+# Function that checks whether a value read from a file is missing: an empty cell, a "?", or None
+def is_missing(value):
+	return value == None or (isinstance(value, basestring) and value.strip() in ["", "?"])
+
+# Function that works out how a column is split on from its values, leaving out the missing ones: "numeric" if they are numbers
+# (true/false counting as 1/0), "boolean" if they are all true/false (or there are none), and "categorical" if they are all text
+# Real tables mark missing numbers with text such as "NA", "N/A" or "null", so text in a column that holds at least as many numbers
+# and true/false values as text is treated as missing too: it is compared with a threshold the way "?" is (see numeric_value),
+# and it is false in a true/false column. A column holding more text than anything else is categorical, and its numbers and
+# true/false values are not among its categories (see common_categories)
+def column_kind(values):
+	# Most columns hold a single type, which can be checked without looking at the values one at a time
+	types = set(map(type, values))
+	if types <= set([bool]):
+		return "boolean"
+	if types <= NUMBER_TYPES:
+		return "numeric"
+	text_count = 0
+	other_count = 0
+	has_number = False
+	for value in values:
+		if is_missing(value):
+			continue
+		if isinstance(value, basestring):
+			text_count += 1
+		else:
+			other_count += 1
+			if is_number(value):
+				has_number = True
+	if text_count > other_count:
+		return "categorical"
+	if has_number:
+		return "numeric"
+	return "boolean"
+
+# The types of the values a numeric column can hold without any of them being missing
+NUMBER_TYPES = set([bool, int, long, float])
+
+# Function that returns how the values of a numeric column are compared with a threshold (see numeric_value), as a float array
+def numeric_values(values):
+	if set(map(type, values)) <= NUMBER_TYPES:
+		return np.fromiter(values, dtype=float, count=len(values))
+	return np.array(map(numeric_value, values), dtype=float)
+
+# Function that returns whether each value of a column is true, as a boolean array
+def boolean_values(values):
+	if set(map(type, values)) <= set([bool]):
+		return np.fromiter(values, dtype=bool, count=len(values))
+	return np.array([value == True for value in values], dtype=bool)
+
+# Function that picks the values a categorical column is split on: its max_bins most common text values (the first in sorted order
+# winning ties), in sorted order. Missing values, numbers and true/false values are never a category
+def common_categories(values, max_bins):
+	counts = {}
+	for value in values:
+		if isinstance(value, basestring) and not is_missing(value):
+			counts[value] = counts.get(value, 0) + 1
+	common = sorted(sorted(counts), key=lambda value: -counts[value])[:max_bins]
+	return sorted(common)
+
+# Function that returns the category number of every value, or -1 for a value that isn't one of the categories
+def category_codes(values, categories):
+	numbers = dict([(categories[i], i) for i in range(len(categories))])
+	return np.array([numbers.get(value, -1) for value in values], dtype=np.intp)
+
+# Function that encodes the first column_count columns of some examples as a matrix predict_batch can use, the same way
+# ExampleMatrix.features encodes a training set, but with the numeric columns and the categories given rather than worked out
+# from these examples (so a tree is always applied to columns encoded the way it was trained on). A numeric column's values are
+# compared to its thresholds the way classify_testingData compares them (see numeric_value), a categorical column holds the
+# category numbers of its values (see category_codes), and every other column is 1.0 where it's true
+def example_features(examples, column_count, numeric_columns, categories={}):
+	if len(numeric_columns) == 0 and len(categories) == 0:
+		features = boolean_matrix(examples, column_count)
+		if features is not None:
+			return features
+		features = np.zeros((len(examples), column_count), dtype=bool)
+	else:
+		features = np.zeros((len(examples), column_count), dtype=float)
+	for column in range(column_count):
+		column_values = map(operator.itemgetter(column), examples)
+		if column in categories:
+			features[:, column] = category_codes(column_values, categories[column])
+		elif column in numeric_columns:
+			features[:, column] = numeric_values(column_values)
+		else:
+			features[:, column] = boolean_values(column_values)
+	return features
+
+# Function that returns the number a value is compared as against a numeric threshold, matching how Python 2 compares the value
+# with a float: numbers and booleans by value, None below every number, and anything else (such as "?") above every number
+def numeric_value(value):
+	if value == None:
+		return -np.inf
+	if isinstance(value, (int, long, float)):
+		return float(value)
+	return np.inf
+
+# Function that picks the bin edges of a numeric column: every distinct value but the largest if there are at most max_bins of them,
+# otherwise the values at max_bins - 1 evenly spaced quantiles (leaving out repeats and the largest value, which nothing is above)
+def quantile_thresholds(values, max_bins):
+	distinct = np.unique(values)
+	if len(distinct) <= max_bins:
+		return distinct[:-1]
+	quantiles = np.percentile(values, np.linspace(0, 100, max_bins + 1)[1:-1], interpolation='lower')
+	return np.unique(quantiles[quantiles < distinct[-1]])
+
 # Implementation of ID3 algorithm
+# The tree is grown one level at a time instead of recursively: every open node of a level gets its counts from the same pass over
+# the examples (see ExampleMatrix.level_counts) and its best attribute from the same array operations (see choose_attributes),
+# then each one is turned into a leaf or split exactly as recursive ID3 would, and the examples at split nodes move down to the
+# next level. The attributes still available at each open node are kept as a row of a boolean array, and attributes are compared
+# in the order attribute_indices lists them, so ties are broken the same way
 def ID3(examples, attribute_indices, default, class_idx, mode):
-	if len(examples) == 0:
-		return default
-	# Go through examples to see if all examples have the same classification
-	same_class = True
-	start_class = examples[0][class_idx]
-	for example in examples:
-		if example[class_idx] != start_class:
-			same_class = False
-			break
-	# If all examples have the same class, then return that class
-	if same_class:
-		return start_class
-	# Else if attributes list is empty, then return most common classification
-	elif len(attribute_indices) == 0:
-		return mode
-	# Otherwise, choose an attribute to split on and recursively call ID3
-	else:
-		best_attribute = choose_attribute(examples, attribute_indices, class_idx)
-		tree = ID3Tree()
-		tree.attribute = best_attribute
-		# best_attribute only has values of true or false, so don't need to loop through all possible values
-		# Just split into true examples and false examples
-		true_examples = []
-		false_examples = []
-		for example in examples:
-			if example[best_attribute] == True:
-				true_examples.append(example)
-			else:
-				false_examples.append(example)
-		# Remove the current attribute from the attributes list by creating a new attribute list that doesn't include it
-		new_attributes = []
-		for i in range(len(attribute_indices)):
-			if attribute_indices[i] != best_attribute:
-				new_attributes.append(attribute_indices[i])
-		# Create true and false subtrees
-		tree.trueChild = ID3(true_examples, new_attributes, mode, class_idx, mode)
-		tree.falseChild = ID3(false_examples, new_attributes, mode, class_idx, mode)
-		return tree
+	example_matrix = ExampleMatrix(examples, class_idx + 1)
+	return ID3_levelwise(example_matrix, attribute_indices, default, class_idx, mode)
+
+# If training_rows is given, only those rows of the example matrix are trained on (the others start out closed)
+def ID3_levelwise(example_matrix, attribute_order, default, class_idx, mode, max_pass_nodes=65536, training_rows=None):
+	node_of = np.zeros(len(example_matrix.values), dtype=np.int32)
+	if training_rows is not None: # (an array can't be compared to None with ==)
+		node_of[:] = -1
+		node_of[training_rows] = 0
+	# Open nodes of the current level: the ID3Tree node they are a child of (None for the root), which branch, and what to return
+	# if no examples reach them. available[k] marks the attributes still available at open node k
+	open_nodes = [(None, None, default)]
+	available = np.zeros((1, example_matrix.values.shape[1]), dtype=bool)
+	available[0, list(attribute_order)] = True
+	root = None
+	while len(open_nodes) > 0:
+		split_columns = np.zeros(len(open_nodes), dtype=np.intp) - 1
+		split_bins = np.zeros(len(open_nodes), dtype=np.intp) - 1
+		true_children = np.zeros(len(open_nodes), dtype=np.intp) - 1
+		false_children = np.zeros(len(open_nodes), dtype=np.intp) - 1
+		next_nodes = []
+		next_parents = [] # the open node each node of the next level is a child of
+		# True/false attributes the nodes of the next level don't get: used_attributes[i] isn't available at node used_nodes[i]
+		used_nodes = []
+		used_attributes = []
+		# The counts of a very wide level are gathered max_pass_nodes nodes at a time, so they never take more than
+		# a few arrays of max_pass_nodes rows
+		for first_node in range(0, len(open_nodes), max_pass_nodes):
+			node_count = min(max_pass_nodes, len(open_nodes) - first_node)
+			example_counts, true_counts, true_class_counts, split_counts, split_class_counts = example_matrix.level_counts(node_of, first_node, node_count, class_idx)
+			class_true_counts = true_counts[:, class_idx]
+			node_available = available[first_node:first_node + node_count]
+			any_available = node_available.any(axis=1)
+			# Only the nodes that will be split need an attribute: those with examples of both classes, and attributes left
+			splitting = np.flatnonzero((class_true_counts > 0) & (class_true_counts < example_counts) & any_available)
+			best_attributes, best_split_bins = choose_attributes(splitting, example_counts, class_true_counts, attribute_order, node_available, true_counts, true_class_counts, split_counts, split_class_counts)
+			# (as lists, since the nodes are gone through one at a time)
+			example_counts = example_counts.tolist()
+			class_true_counts = class_true_counts.tolist()
+			any_available = any_available.tolist()
+			best_attributes = best_attributes.tolist()
+			best_split_bins = best_split_bins.tolist()
+			for k in range(first_node, first_node + node_count):
+				parent, branch, node_default = open_nodes[k]
+				example_count = example_counts[k - first_node]
+				# All examples have the same classification if either none or all of them are classified true
+				true_count = class_true_counts[k - first_node]
+				if example_count == 0:
+					subtree = node_default
+				# If all examples have the same class, then return that class
+				elif true_count == 0 or true_count == example_count:
+					subtree = true_count == example_count
+				# Else if attributes list is empty, then return most common classification
+				elif not any_available[k - first_node]:
+					subtree = mode
+				# If no attribute gains any information there is nothing to split on, so return the most common classification
+				elif best_attributes[k - first_node] < 0:
+					print "Best attribute was none \n"
+					print "max_info_gain was % f \n" % 0
+					subtree = mode
+				# Otherwise, split on the best attribute and open its children on the next level
+				else:
+					best_attribute = best_attributes[k - first_node]
+					split_bin = best_split_bins[k - first_node]
+					subtree = ID3Tree()
+					subtree.attribute = best_attribute
+					# Every split is binary (true/false, above/not above the threshold of a numeric attribute, or one category
+					# against the rest). The children don't get the current attribute if it was true/false. A numeric or categorical
+					# attribute stays available, since its other thresholds (or categories) can still split the examples on either side
+					if split_bin < 0:
+						used_nodes.extend([len(next_nodes), len(next_nodes) + 1])
+						used_attributes.extend([best_attribute, best_attribute])
+					elif best_attribute in example_matrix.categories:
+						subtree.category = example_matrix.categories[best_attribute][split_bin]
+					else:
+						subtree.threshold = float(example_matrix.thresholds[best_attribute][split_bin])
+					split_bins[k] = split_bin
+					split_columns[k] = best_attribute
+					true_children[k] = len(next_nodes)
+					next_nodes.append((subtree, True, mode))
+					false_children[k] = len(next_nodes)
+					next_nodes.append((subtree, False, mode))
+					next_parents.extend([k, k])
+				if parent == None:
+					root = subtree
+				elif branch:
+					parent.trueChild = subtree
+				else:
+					parent.falseChild = subtree
+		example_matrix.advance(node_of, split_columns, split_bins, true_children, false_children)
+		open_nodes = next_nodes
+		available = available[np.array(next_parents, dtype=np.intp)]
+		available[np.array(used_nodes, dtype=np.intp), np.array(used_attributes, dtype=np.intp)] = False
+	return root
 
 # Function used to classify an example using a decision tree that was generated from training data
+# Walks down from the root in a loop until it reaches a leaf, so the depth of the tree doesn't matter
 def classify_testingData(ID3Tree, example):
-	classification = None
-	if ID3Tree == True or ID3Tree == False:
-		return ID3Tree
-	attribute = ID3Tree.attribute
-	trueChild = ID3Tree.trueChild
-	falseChild = ID3Tree.falseChild
-	if example[attribute] == True:
-		# go down the true branch
-		if trueChild == True or trueChild == False:
-			# we are at a leaf, so return the value
-			classification = trueChild
+	node = ID3Tree
+	while not (node == True or node == False):
+		if node.category != None:
+			go_true = example[node.attribute] == node.category
+		elif node.threshold != None:
+			go_true = example[node.attribute] > node.threshold
 		else:
-			# we need to split again on the child attribute
-			classification = classify_testingData(trueChild, example)
-	else:
-		# go down the false branch
-		if falseChild == True or falseChild == False:
-			# we are at a leaf, so return the value
-			classification = falseChild
+			go_true = example[node.attribute] == True
+		if go_true:
+			# go down the true branch
+			node = node.trueChild
+		else:
+			# go down the false branch
+			node = node.falseChild
+	# we are at a leaf, so return the value
+	return node
+
+#### Class used to store a trained tree as flat arrays with one entry per node, node 0 being the root
+# attributes[i] is the attribute node i splits on, with its children at true_children[i] and false_children[i],
+# or -1 if node i is a leaf, in which case values[i] is its classification. An example goes down the true branch when its value
+# for the attribute is above thresholds[i], which is 0.5 for true/false attributes (true counts as 1 and false as 0).
+# If equals[i] is set the attribute is categorical, and an example goes down the true branch when its category number equals
+# thresholds[i]; categories[attribute] lists the values the category numbers stand for
+class FlatTree:
+	def __init__(self):
+		self.attributes = None
+		self.thresholds = None
+		self.equals = None
+		self.categories = None
+		self.true_children = None
+		self.false_children = None
+		self.values = None
+
+# Function that compiles a tree made by ID3 (an ID3Tree, or just True or False) into a FlatTree
+# The category numbers are the positions of the values in categories (such as an ExampleMatrix's, so the tree can classify rows
+# of its features), or if none are given, in the sorted values the tree splits on
+def flatten_tree(ID3Tree, categories=None):
+	if categories == None:
+		categories = split_categories(ID3Tree)
+	attributes = []
+	thresholds = []
+	equals = []
+	true_children = []
+	false_children = []
+	values = []
+	# Each entry is a subtree still to be added, and the node (and branch) it is the child of
+	stack = [(ID3Tree, None, None)]
+	while len(stack) > 0:
+		tree, parent, branch = stack.pop()
+		node = len(attributes)
+		if parent != None:
+			if branch:
+				true_children[parent] = node
+			else:
+				false_children[parent] = node
+		true_children.append(0)
+		false_children.append(0)
+		if tree == True or tree == False:
+			attributes.append(-1)
+			thresholds.append(0.5)
+			equals.append(False)
+			values.append(tree)
+		else:
+			attributes.append(tree.attribute)
+			if tree.category != None:
+				thresholds.append(float(categories[tree.attribute].index(tree.category)))
+			else:
+				thresholds.append(0.5 if tree.threshold == None else tree.threshold)
+			equals.append(tree.category != None)
+			values.append(False)
+			stack.append((tree.falseChild, node, False))
+			stack.append((tree.trueChild, node, True))
+	flat_tree = FlatTree()
+	flat_tree.attributes = np.array(attributes, dtype=np.intp)
+	flat_tree.thresholds = np.array(thresholds, dtype=float)
+	flat_tree.equals = np.array(equals, dtype=bool)
+	flat_tree.categories = dict([(column, list(categories[column])) for column in categories])
+	flat_tree.true_children = np.array(true_children, dtype=np.intp)
+	flat_tree.false_children = np.array(false_children, dtype=np.intp)
+	flat_tree.values = np.array(values, dtype=bool)
+	return flat_tree
+
+# Function that classifies every row of a 2-D array of examples (one column per attribute, see ExampleMatrix.features) with a flattened tree
+# All of the examples start at the root and move down one level per step together, so there is one round of array operations per level
+def predict_batch(flat_tree, example_values):
+	nodes = np.zeros(len(example_values), dtype=np.intp)
+	rows = np.arange(len(example_values)) # examples that haven't reached a leaf yet
+	while len(rows) > 0:
+		current = nodes[rows]
+		attributes = flat_tree.attributes[current]
+		inner = attributes >= 0
+		rows = rows[inner]
+		current = current[inner]
+		values = example_values[rows, attributes[inner]]
+		go_true = np.where(flat_tree.equals[current], values == flat_tree.thresholds[current], values > flat_tree.thresholds[current])
+		nodes[rows] = np.where(go_true, flat_tree.true_children[current], flat_tree.false_children[current])
+	return flat_tree.values[nodes]
+
+#### Saved models
+# A trained tree is saved as its FlatTree arrays plus the attribute names (the class last), so it can classify new examples
+# without any training data. The file is a header (magic string, version, number of nodes, number of names, and the start and size
+# of each section) followed by these sections, each 8-byte aligned:
+#  - attributes, true_children and false_children: int32 per node
+#  - thresholds: float64 per node
+#  - values: one byte (0 or 1) per node
+#  - name offsets: uint32 start of each attribute name in the names section, plus the end of the last name
+#  - names: every attribute name in one contiguous byte buffer
+#  - numeric: one byte per attribute name, 1 if the tree splits on it as a numeric attribute (at a threshold), so new examples
+#    are encoded the way the tree was trained rather than by looking at whatever values the new file holds
+#  - equals: one byte (0 or 1) per node, 1 if the node splits on a categorical attribute (see FlatTree)
+#  - category attributes: int32 attribute of each category value, in category number order for each attribute
+#  - category offsets and category values: the category values, stored like the names
+# The header also holds the number of category values
+# load_model maps the file with mmap and the node arrays are read straight out of it, so nothing is parsed when a model is loaded
+MODEL_MAGIC = "ID3MODEL"
+MODEL_VERSION = 3
+MODEL_HEADER = struct.Struct("<8sIIII" + "QQ" * 12)
+
+# Function that saves a tree made by ID3 (an ID3Tree, or just True or False) and the attribute names it was trained with
+def save_model(ID3Tree, attribute_names, modelFileName):
+	flat_tree = flatten_tree(ID3Tree)
+	name_offsets = np.zeros(len(attribute_names) + 1, dtype=np.uint32)
+	name_offsets[1:] = np.cumsum([len(name) for name in attribute_names])
+	numeric = np.zeros(len(attribute_names), dtype=np.uint8)
+	for column in numeric_split_columns(ID3Tree):
+		numeric[column] = 1
+	category_columns = []
+	category_values = []
+	for column in sorted(flat_tree.categories):
+		category_columns.extend([column] * len(flat_tree.categories[column]))
+		category_values.extend(flat_tree.categories[column])
+	category_offsets = np.zeros(len(category_values) + 1, dtype=np.uint32)
+	category_offsets[1:] = np.cumsum([len(value) for value in category_values])
+	sections = [flat_tree.attributes.astype(np.int32).tostring(), flat_tree.true_children.astype(np.int32).tostring(),
+				flat_tree.false_children.astype(np.int32).tostring(), flat_tree.thresholds.astype(np.float64).tostring(),
+				flat_tree.values.astype(np.uint8).tostring(), name_offsets.tostring(), "".join(attribute_names), numeric.tostring(),
+				flat_tree.equals.astype(np.uint8).tostring(), np.array(category_columns, dtype=np.int32).tostring(),
+				category_offsets.tostring(), "".join(category_values)]
+	# Lay the sections out one after another after the header, keeping track of where each one starts
+	positions = []
+	position = MODEL_HEADER.size
+	for section in sections:
+		positions.extend([position, len(section)])
+		position += len(pad_section(section))
+	with open(modelFileName, "wb") as out_file:
+		out_file.write(MODEL_HEADER.pack(MODEL_MAGIC, MODEL_VERSION, len(flat_tree.attributes), len(attribute_names), len(category_values), *positions))
+		for section in sections:
+			out_file.write(pad_section(section))
+
+# Function that pads a section with zero bytes to a multiple of 8 bytes
+def pad_section(section):
+	return section + "\0" * (-len(section) % 8)
+
+# Function that returns the attributes a tree splits on at a threshold (its numeric attributes), in no particular order
+def numeric_split_columns(ID3Tree):
+	columns = set()
+	stack = [ID3Tree]
+	while len(stack) > 0:
+		tree = stack.pop()
+		if tree == True or tree == False:
+			continue
+		if tree.threshold != None:
+			columns.add(tree.attribute)
+		stack.append(tree.trueChild)
+		stack.append(tree.falseChild)
+	return list(columns)
+
+# Function that returns the categories a tree splits on: a dictionary from each categorical attribute to its values, sorted
+def split_categories(ID3Tree):
+	categories = {}
+	stack = [ID3Tree]
+	while len(stack) > 0:
+		tree = stack.pop()
+		if tree == True or tree == False:
+			continue
+		if tree.category != None:
+			categories.setdefault(tree.attribute, set()).add(tree.category)
+		stack.append(tree.trueChild)
+		stack.append(tree.falseChild)
+	return dict([(column, sorted(categories[column])) for column in categories])
+
+# Function that loads a model saved by save_model. Returns the tree as a FlatTree, the attribute names, and the numeric attributes
+def load_model(modelFileName):
+	with open(modelFileName, "rb") as in_file:
+		# The mapping stays valid after the file is closed, and the arrays below keep it alive
+		model_map = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+	header = MODEL_HEADER.unpack_from(model_map, 0)
+	if header[0] != MODEL_MAGIC or header[1] != MODEL_VERSION:
+		raise ValueError("%s is not a version %d decision tree model" % (modelFileName, MODEL_VERSION))
+	node_count = header[2]
+	name_count = header[3]
+	category_count = header[4]
+	positions = header[5::2]
+	flat_tree = FlatTree()
+	flat_tree.attributes = np.frombuffer(model_map, dtype=np.int32, count=node_count, offset=positions[0])
+	flat_tree.true_children = np.frombuffer(model_map, dtype=np.int32, count=node_count, offset=positions[1])
+	flat_tree.false_children = np.frombuffer(model_map, dtype=np.int32, count=node_count, offset=positions[2])
+	flat_tree.thresholds = np.frombuffer(model_map, dtype=np.float64, count=node_count, offset=positions[3])
+	flat_tree.values = np.frombuffer(model_map, dtype=np.uint8, count=node_count, offset=positions[4]).view(bool)
+	name_offsets = np.frombuffer(model_map, dtype=np.uint32, count=name_count + 1, offset=positions[5]).tolist()
+	attribute_names = [model_map[positions[6] + name_offsets[i]:positions[6] + name_offsets[i+1]] for i in range(name_count)]
+	numeric_columns = np.flatnonzero(np.frombuffer(model_map, dtype=np.uint8, count=name_count, offset=positions[7])).tolist()
+	flat_tree.equals = np.frombuffer(model_map, dtype=np.uint8, count=node_count, offset=positions[8]).view(bool)
+	category_columns = np.frombuffer(model_map, dtype=np.int32, count=category_count, offset=positions[9]).tolist()
+	category_offsets = np.frombuffer(model_map, dtype=np.uint32, count=category_count + 1, offset=positions[10]).tolist()
+	flat_tree.categories = {}
+	for i in range(category_count):
+		flat_tree.categories.setdefault(category_columns[i], []).append(model_map[positions[11] + category_offsets[i]:positions[11] + category_offsets[i+1]])
+	return flat_tree, attribute_names, numeric_columns
+
+# Function that trains a tree on every example of a file and saves it with save_model
+def train_model(inputFileName, modelFileName):
+	examples = read_data(inputFileName)
+	attribute_names = examples[0]
+	examples = examples[1:len(examples)]
+	class_idx = len(attribute_names) - 1
+	mode = Mode(examples, class_idx)
+	decision_tree = ID3(examples, range(class_idx), mode, class_idx, mode)
+	print_tree(decision_tree, attribute_names, None, 0, None)
+	save_model(decision_tree, attribute_names, modelFileName)
+	print "\n" + "model trained on %d examples saved to %s" % (len(examples), modelFileName)
+
+# Function that classifies the examples of a file with a model saved by save_model, and prints each example with its classification
+# The columns of the file are matched to the model's attributes by name, so they can be in any order, and the class column is
+# only needed to report how many examples were classified correctly
+def classify_with_model(modelFileName, inputFileName):
+	flat_tree, model_names, numeric_columns = load_model(modelFileName)
+	examples = read_data(inputFileName)
+	input_names = examples[0]
+	examples = examples[1:len(examples)]
+	for name in model_names[:-1]:
+		if name not in input_names:
+			raise ValueError("%s has no column for the model attribute %s" % (inputFileName, name))
+	columns = [input_names.index(name) for name in model_names[:-1]]
+	has_class = model_names[-1] in input_names
+	if has_class:
+		columns.append(input_names.index(model_names[-1]))
+	# Put the columns in the order the model uses, so the attribute numbers stored in the tree pick the right ones,
+	# and encode them with the model's numeric attributes and categories
+	model_examples = [[example[column] for column in columns] for example in examples]
+	classifications = predict_batch(flat_tree, example_features(model_examples, len(model_names) - 1, numeric_columns, flat_tree.categories))
+	print input_names + ['ID3 Class']
+	for i in range(len(examples)):
+		print examples[i] + [bool(classifications[i])]
+	if has_class and len(examples) > 0:
+		classes = np.array([example[-1] == True for example in model_examples], dtype=bool)
+		correct_classifications = int(np.count_nonzero(classifications == classes))
+		print "\n" + "Percent of examples correctly classified by the saved decision tree = %.0f%%" % (100.0 * correct_classifications / len(examples))
+
+#### Classes used to learn a decision tree from a stream of examples (a Hoeffding tree, or VFDT)
+# Internal nodes are ordinary ID3Tree nodes. Leaves are HoeffdingLeaf objects that keep counts of the examples that reached them,
+# for each attribute still available, value of that attribute and classification, so the examples themselves are never stored
+# and memory only grows with the size of the tree. Every grace_period examples a leaf compares the information gain of its
+# best attribute with the second best: the Hoeffding bound says that once n examples have been seen, the true difference is
+# within epsilon = sqrt(R^2 ln(1/delta) / 2n) of the observed one with probability 1 - delta (R = 1, the range of the gain for two classes),
+# so the leaf splits when the observed difference is bigger than epsilon, or when epsilon drops below tie_threshold (the two are about as good)
+class HoeffdingLeaf:
+	def __init__(self, attribute_indices, prediction):
+		self.attribute_indices = attribute_indices # attributes not split on yet on the path to this leaf
+		self.prediction = prediction # classification used until the leaf has seen examples of its own
+		self.class_counts = [0, 0] # number of examples classified false and true
+		self.counts = np.zeros((len(attribute_indices), 2, 2), dtype=np.int64) # [attribute, value, classification]
+		self.seen_since_check = 0
+
+	# Function that returns the most common classification of the examples seen at the leaf (ties go to true, as in Mode)
+	def classify(self):
+		if self.class_counts[0] + self.class_counts[1] == 0:
+			return self.prediction
+		return self.class_counts[1] >= self.class_counts[0]
+
+class HoeffdingTree:
+	def __init__(self, attribute_indices, class_idx, delta=1e-7, grace_period=200, tie_threshold=0.05):
+		self.class_idx = class_idx
+		self.delta = delta
+		self.grace_period = grace_period
+		self.tie_threshold = tie_threshold
+		self.root = HoeffdingLeaf(list(attribute_indices), True)
+		self.leaf_count = 1
+
+	# Function that returns the leaf an example ends up at, along with its parent node (None for the root) and the branch it is on
+	def find_leaf(self, example):
+		parent = None
+		branch = None
+		node = self.root
+		while isinstance(node, ID3Tree):
+			parent = node
+			branch = example[node.attribute] == True
+			if branch:
+				node = node.trueChild
+			else:
+				node = node.falseChild
+		return node, parent, branch
+
+	# Function that classifies an example with the tree learned so far
+	def classify(self, example):
+		return self.find_leaf(example)[0].classify()
+
+	# Function that adds one example to the counts of its leaf, and splits the leaf if it has seen enough examples to be sure of its best attribute
+	def learn(self, example):
+		leaf, parent, branch = self.find_leaf(example)
+		classification = int(example[self.class_idx] == True)
+		leaf.class_counts[classification] += 1
+		values = [int(example[att_idx] == True) for att_idx in leaf.attribute_indices]
+		leaf.counts[np.arange(len(values)), values, classification] += 1
+		leaf.seen_since_check += 1
+		if leaf.seen_since_check >= self.grace_period and leaf.class_counts[0] > 0 and leaf.class_counts[1] > 0:
+			leaf.seen_since_check = 0
+			node = self.split_leaf(leaf)
+			if node != None:
+				if parent == None:
+					self.root = node
+				elif branch:
+					parent.trueChild = node
+				else:
+					parent.falseChild = node
+
+	# Function that returns an ID3Tree node to replace the leaf with, or None if the leaf shouldn't split yet
+	def split_leaf(self, leaf):
+		example_count = leaf.class_counts[0] + leaf.class_counts[1]
+		prev_entropy = calculate_entropy(leaf.class_counts[1], example_count)
+		gains = []
+		for i in range(len(leaf.attribute_indices)):
+			true_count = int(leaf.counts[i, 1].sum())
+			gains.append(information_gain(prev_entropy, example_count, leaf.class_counts[1], true_count, int(leaf.counts[i, 1, 1])))
+		if len(gains) == 0:
+			return None
+		# The first attribute wins ties, as in choose_attributes
+		best = gains.index(max(gains))
+		second_gain = max(gains[:best] + gains[best + 1:] + [0])
+		epsilon = math.sqrt(math.log(1 / self.delta) / (2.0 * example_count))
+		if gains[best] <= 0 or (gains[best] - second_gain <= epsilon and epsilon >= self.tie_threshold):
+			return None
+		node = ID3Tree()
+		node.attribute = leaf.attribute_indices[best]
+		new_attributes = leaf.attribute_indices[:best] + leaf.attribute_indices[best + 1:]
+		# Until the new leaves see examples of their own, they predict the most common classification on their side of the split
+		node.trueChild = HoeffdingLeaf(new_attributes, leaf.counts[best, 1, 1] >= leaf.counts[best, 1, 0])
+		node.falseChild = HoeffdingLeaf(new_attributes, leaf.counts[best, 0, 1] >= leaf.counts[best, 0, 0])
+		self.leaf_count += 1
+		return node
+
+	# Function that returns the tree learned so far as an ID3 tree (leaves replaced by their classifications), for print_tree or flatten_tree
+	def to_ID3Tree(self):
+		return hoeffding_to_ID3Tree(self.root)
+
+# Function that copies a Hoeffding tree into an ID3 tree with its leaves replaced by their classifications
+# Subtrees still to be copied are kept on a stack instead of the call stack, so the depth of the tree doesn't matter
+def hoeffding_to_ID3Tree(node):
+	root = None
+	# Each entry is a subtree still to be copied, and the ID3Tree node (and branch) its copy is the child of
+	stack = [(node, None, None)]
+	while len(stack) > 0:
+		node, parent, branch = stack.pop()
+		if isinstance(node, HoeffdingLeaf):
+			tree = bool(node.classify())
 		else:
-			# we need to split again on the child attribute
-			classification = classify_testingData(falseChild, example)
-	return classification
+			tree = ID3Tree()
+			tree.attribute = node.attribute
+			stack.append((node.falseChild, tree, False))
+			stack.append((node.trueChild, tree, True))
+		if parent == None:
+			root = tree
+		elif branch:
+			parent.trueChild = tree
+		else:
+			parent.falseChild = tree
+	return root
+
+# Function that returns the first column of an example holding something other than true, false or a missing value, or None if there isn't one
+def non_boolean_column(example):
+	if set(map(type, example)) <= set([bool]):
+		return None
+	for column in range(len(example)):
+		if not isinstance(example[column], bool) and not is_missing(example[column]):
+			return column
+	return None
 
-# Function to calculate entropy
-def calculate_entropy(examples, class_idx):
+# Function that learns a Hoeffding tree from the examples in a file, reading one row at a time
+# Each example is classified by the tree learned so far before it is learned from, which gives a running (prequential) accuracy
+def stream_learn(inputFileName, options):
+	rows = iter_data(inputFileName)
+	attribute_names = next(rows)
+	class_idx = len(attribute_names) - 1
+	tree = HoeffdingTree(range(class_idx), class_idx, options["delta"], options["grace_period"], options["tie_threshold"])
+	start = time.time()
+	example_count = 0
+	correct_classifications = 0
+	for example in rows:
+		# The leaves only count true/false values, so a number or text would silently be learned as false
+		column = non_boolean_column(example)
+		if column != None:
+			print "Stream mode only learns from true/false values, but %s is %r in example %d of %s" % (attribute_names[column], example[column], example_count + 1, inputFileName)
+			print "Use python decisiontree.py <inputFileName> <trainingSetSize> <numberOfTrials> <verbose> to learn from numeric or text columns"
+			sys.exit(1)
+		if tree.classify(example) == (example[class_idx] == True):
+			correct_classifications += 1
+		tree.learn(example)
+		example_count += 1
+		if example_count % options["report_every"] == 0:
+			print "%d examples: %d leaves, %.1f%% of examples classified correctly before being learned from" % (example_count, tree.leaf_count, 100.0 * correct_classifications / example_count)
+	decision_tree = tree.to_ID3Tree()
+	print_tree(decision_tree, attribute_names, None, 0, None)
+	if options["save_model"] != None:
+		save_model(decision_tree, attribute_names, options["save_model"])
+	print "\n" + "------------------------------------------------------------------------------"
+	print "Summary:"
+	print "file used = %s" % inputFileName
+	print "number of examples = %d" % example_count
+	print "number of leaves = %d" % tree.leaf_count
+	if options["save_model"] != None:
+		print "model saved to %s" % options["save_model"]
+	if example_count > 0:
+		print "percent of examples correctly classified before being learned from = %.1f%%" % (100.0 * correct_classifications / example_count)
+	print "time elapsed = %.1f seconds" % (time.time() - start)
+	print "------------------------------------------------------------------------------ \n"
+
+# Function to calculate entropy from the number of examples and how many of them are classified true
+def calculate_entropy(true_count, example_count):
 	entropy = 0
-	true_count = 0
 	# If there are no examples, return 0
-	if len(examples) == 0:
+	if example_count == 0:
 		return 0
-	# attributes are only either true or false (this is a binary decision tree) so just need to count the number of true examples
-	for example in examples:
-		if example[class_idx] == True:
-			true_count += 1
-	p_true = float(true_count) / float(len(examples))
+	# attributes are only either true or false (this is a binary decision tree) so just need the number of true examples
+	p_true = float(true_count) / float(example_count)
 	p_false = 1 - p_true
 	# If the percentage of true is either 100% or 0%, just return 0 for the entropy
 	if p_true == 1 or p_true == 0:
@@ -205,62 +1256,132 @@ def calculate_entropy(examples, class_idx):
 	entropy = -(p_true * math.log(p_true, 2)) - (p_false * math.log(p_false, 2))
 	return entropy
 
-# Function to choose the best attribute by calculating information gain (using entropy function)
-def choose_attribute(examples, remaining_attributes, class_idx):
-	best_attribute = None
-	prev_entropy = calculate_entropy(examples, class_idx)
-	max_info_gain = 0
-	# go through remaining attributes, split into true/false based on that attribute, and calculate entropy
-	for att_idx in remaining_attributes:
-		true_examples = []
-		false_examples = []
-		for example in examples:
-			if example[att_idx] == True:
-				true_examples.append(example)
-			else:
-				false_examples.append(example)
-		# Calculate the entropy from splitting into true/false based on the current attribute
-		true_example_pct = float(len(true_examples)) / float(len(examples))
-		false_example_pct = 1 - true_example_pct
-		curr_entropy = (true_example_pct * calculate_entropy(true_examples, class_idx)) + (false_example_pct * calculate_entropy(false_examples, class_idx))
-		info_gain = prev_entropy - curr_entropy
-		# Check if the info gain for the current attribute is greater than the max info gain
-		if info_gain > max_info_gain:
-			best_attribute = att_idx
-			max_info_gain = info_gain
-	if best_attribute == None:
-		print "Best attribute was none \n"
-		print "max_info_gain was % f \n" % max_info_gain
-	return best_attribute
+# Function that calculates the information gain of splitting example_count examples (class_true_count of them classified true)
+# into the true_count examples on the true side (true_class_count of them classified true) and the rest
+def information_gain(prev_entropy, example_count, class_true_count, true_count, true_class_count):
+	false_count = example_count - true_count
+	false_class_count = class_true_count - true_class_count
+	# Calculate the entropy from splitting into true/false based on the current attribute
+	true_example_pct = float(true_count) / float(example_count)
+	false_example_pct = 1 - true_example_pct
+	curr_entropy = (true_example_pct * calculate_entropy(true_class_count, true_count)) + (false_example_pct * calculate_entropy(false_class_count, false_count))
+	return prev_entropy - curr_entropy
+
+# Function that works out calculate_entropy for whole arrays of counts at once, with the same arithmetic
+def calculate_entropies(true_counts, example_counts):
+	with np.errstate(divide='ignore', invalid='ignore'):
+		p_true = true_counts / example_counts.astype(float)
+		p_false = 1 - p_true
+		entropies = -(p_true * (np.log(p_true) / math.log(2))) - (p_false * (np.log(p_false) / math.log(2)))
+	# No examples, or all of them with the same classification, is no entropy
+	return np.where((example_counts == 0) | (p_true == 1) | (p_true == 0), 0.0, entropies)
+
+# Function that works out information_gain for whole arrays of counts at once, with the same arithmetic
+def information_gains(prev_entropies, example_counts, class_true_counts, true_counts, true_class_counts):
+	false_counts = example_counts - true_counts
+	false_class_counts = class_true_counts - true_class_counts
+	true_example_pcts = true_counts / example_counts.astype(float)
+	false_example_pcts = 1 - true_example_pcts
+	curr_entropies = (true_example_pcts * calculate_entropies(true_class_counts, true_counts)) + (false_example_pcts * calculate_entropies(false_class_counts, false_counts))
+	return prev_entropies - curr_entropies
+
+# Function to choose the best attribute of each of the nodes numbered in nodes by calculating information gain
+# The counts come from ExampleMatrix.level_counts, with one row per node: true_counts[k][c] and true_class_counts[k][c] for a
+# true/false column c, and split_counts[c][k][t] and split_class_counts[c][k][t] for each threshold (or category) t of a numeric
+# (or categorical) column c. available[k] marks the attributes node k can still split on
+# Every split of every available attribute is scored at once, in attribute_order (and threshold order). Each node takes the first
+# split with its highest gain if that is above 0, which is the split comparing the gains one at a time with "strictly greater than
+# the best so far" would choose, so ties still go to the attribute (and the threshold) that comes first
+# Returns the best attribute of each node (-1 if none gains any information, or for nodes not in nodes) and, for a numeric one,
+# the bin number of the best threshold, or for a categorical one, the number of the best category (-1 for a true/false attribute)
+def choose_attributes(nodes, example_counts, class_true_counts, attribute_order, available, true_counts, true_class_counts, split_counts, split_class_counts, chunk_size=262144):
+	# Every split, as a column of true_counts, or of one of the split counts placed after them in order of their column number
+	split_columns = sorted(split_counts)
+	offsets = {}
+	offset = true_counts.shape[1]
+	for column in split_columns:
+		offsets[column] = offset
+		offset += split_counts[column].shape[1]
+	candidate_positions = []
+	candidate_attributes = []
+	candidate_bins = []
+	for att_idx in attribute_order:
+		if att_idx in split_counts:
+			bin_count = split_counts[att_idx].shape[1]
+			candidate_positions.extend(range(offsets[att_idx], offsets[att_idx] + bin_count))
+			candidate_attributes.extend([att_idx] * bin_count)
+			candidate_bins.extend(range(bin_count))
+		else:
+			candidate_positions.append(att_idx)
+			candidate_attributes.append(att_idx)
+			candidate_bins.append(-1)
+	candidate_positions = np.array(candidate_positions, dtype=np.intp)
+	candidate_attributes = np.array(candidate_attributes, dtype=np.intp)
+	candidate_bins = np.array(candidate_bins, dtype=np.intp)
+	best_attributes = np.zeros(len(example_counts), dtype=np.intp) - 1
+	best_split_bins = np.zeros(len(example_counts), dtype=np.intp) - 1
+	if len(candidate_positions) == 0:
+		return best_attributes, best_split_bins
+	# The gains are worked out for a few nodes at a time, so they never take more than a few arrays of about chunk_size values
+	step = max(1, chunk_size // len(candidate_positions))
+	for start in range(0, len(nodes), step):
+		rows = nodes[start:start + step]
+		counts = np.concatenate([true_counts[rows]] + [split_counts[column][rows] for column in split_columns], axis=1)[:, candidate_positions]
+		class_counts = np.concatenate([true_class_counts[rows]] + [split_class_counts[column][rows] for column in split_columns], axis=1)[:, candidate_positions]
+		example_count = example_counts[rows][:, np.newaxis]
+		class_true_count = class_true_counts[rows][:, np.newaxis]
+		gains = information_gains(calculate_entropies(class_true_count, example_count), example_count, class_true_count, counts, class_counts)
+		# An attribute that isn't available can't be chosen, and neither can one that gains nothing
+		gains[~available[rows][:, candidate_attributes]] = 0
+		best = np.argmax(gains, axis=1)
+		gained = gains[np.arange(len(rows)), best] > 0
+		best_attributes[rows[gained]] = candidate_attributes[best[gained]]
+		best_split_bins[rows[gained]] = candidate_bins[best[gained]]
+	return best_attributes, best_split_bins
+
+# Function that returns how the split at a node is printed: the attribute name, followed by the threshold for a numeric attribute
+# or the category for a categorical one
+def split_name(ID3Tree, attribute_names):
+	if ID3Tree.category != None:
+		return "%s = %s" % (attribute_names[ID3Tree.attribute], ID3Tree.category)
+	if ID3Tree.threshold == None:
+		return attribute_names[ID3Tree.attribute]
+	return "%s > %g" % (attribute_names[ID3Tree.attribute], ID3Tree.threshold)
 
+# Function that prints a tree, one node at a time: the true subtree of a node is printed in full before its false subtree
+# Subtrees still to be printed are kept on a stack instead of the call stack, so the depth of the tree doesn't matter
 def print_tree(ID3Tree, attribute_names, parent, level, branch):
-	print "level %d" % level
-	level += 1
-	if ID3Tree == True or ID3Tree == False:
-		return ID3Tree
-	attribute = ID3Tree.attribute
-	trueChild = ID3Tree.trueChild
-	falseChild = ID3Tree.falseChild
-	printTrueChild = True
-	printFalseChild = True
-	if parent == None:
-		print "Root attribute is %s." % attribute_names[attribute]
-	else:
-		print "Node attribute is %s. " % attribute_names[attribute] + "Parent attribute was %s, " % attribute_names[parent] + "and attribute is on %s branch." % branch
-	if trueChild == True or trueChild == False:
-		print "True child is a leaf, all attributes are %s." % trueChild
-		printTrueChild = False
-	else:
-		print "True child node is attribute %s" % attribute_names[trueChild.attribute]
-	if falseChild == True or falseChild == False:
-		print "False child is a leaf, all attributes are %s. \n" % falseChild
-		printFalseChild = False
-	else:
-		print "False child node is attribute %s. \n" % attribute_names[falseChild.attribute]
-	if printTrueChild:
-		print_tree(trueChild, attribute_names, attribute, level, True)
-	if printFalseChild:
-		print_tree(falseChild, attribute_names, attribute, level, False)
+	stack = [(ID3Tree, parent, level, branch)]
+	while len(stack) > 0:
+		tree, parent, level, branch = stack.pop()
+		print "level %d" % level
+		level += 1
+		if tree == True or tree == False:
+			continue
+		attribute = tree.attribute
+		trueChild = tree.trueChild
+		falseChild = tree.falseChild
+		printTrueChild = True
+		printFalseChild = True
+		if parent == None:
+			print "Root attribute is %s." % split_name(tree, attribute_names)
+		else:
+			print "Node attribute is %s. " % split_name(tree, attribute_names) + "Parent attribute was %s, " % attribute_names[parent] + "and attribute is on %s branch." % branch
+		if trueChild == True or trueChild == False:
+			print "True child is a leaf, all attributes are %s." % trueChild
+			printTrueChild = False
+		else:
+			print "True child node is attribute %s" % split_name(trueChild, attribute_names)
+		if falseChild == True or falseChild == False:
+			print "False child is a leaf, all attributes are %s. \n" % falseChild
+			printFalseChild = False
+		else:
+			print "False child node is attribute %s. \n" % split_name(falseChild, attribute_names)
+		# The false child goes on the stack first, so the true child's subtree comes off it (and gets printed) first
+		if printFalseChild:
+			stack.append((falseChild, attribute, level, False))
+		if printTrueChild:
+			stack.append((trueChild, attribute, level, True))
 
 def print_verbose(attribute_names, training_examples, classified_examples):
 	print "\n" + "The set of examples in the training set:"
@@ -278,11 +1399,12 @@ def print_verbose(attribute_names, training_examples, classified_examples):
 		print cl_ex
 
 # Function to print the output
-def summary_output(inputFileName, trainingSetSize, testingSetSize, numberOfTrials, ID3_results, PP_results):
+def summary_output(inputFileName, trainingSetSize, testingSetSize, numberOfTrials, ID3_results, PP_results, trial_times, master_seed):
 	print "\n" + "------------------------------------------------------------------------------"
 	print "Summary:"
 	print "file used = %s" % inputFileName
 	print "number of trials = %d" % numberOfTrials
+	print "master seed = %d (pass --seed %d to repeat these trials)" % (master_seed, master_seed)
 	print "training set size for each trial = %d" % trainingSetSize
 	print "testing set size for each trial = %d" % testingSetSize
 	if numberOfTrials == 0:
@@ -295,6 +1417,9 @@ def summary_output(inputFileName, trainingSetSize, testingSetSize, numberOfTrial
 			avg_PP = float(sum(PP_results))/float(len(PP_results))
 			print "mean performance of using prior probability derived from the training set = %.0f%% correct classification" % (100 * avg_PP)
 			print "mean performance of decision tree over all trials = %.0f%% correct classification" % (100 * avg_ID3)
+		for trialNumber in range(len(trial_times)):
+			print "time for trial %d = %.3f seconds" % (trialNumber, trial_times[trialNumber])
+		print "total time for all trials = %.3f seconds" % sum(trial_times)
 	print "------------------------------------------------------------------------------ \n"
 
 
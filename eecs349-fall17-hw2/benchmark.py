@@ -0,0 +1,172 @@
+import sys, os
+import json
+import time
+import resource
+import platform
+import subprocess
+import spellcheck
+
+
+# Backends that can be benchmarked, as the spellcheck.py options that select them. The qwerty backends correct with
+# qwerty_levenshtein_distance costs (insertion and deletion cost 1) instead of plain Levenshtein distance
+# Every backend except "cache" runs with the correction cache turned off, so the index itself is what gets measured
+BENCHMARK_BACKENDS = ["scan", "bktree", "vector", "symspell", "cache", "qwerty", "qwerty-vector", "qwerty-qgram"]
+BENCHMARK_OPTIONS = {"scan": ["--cache-size", "0"],
+					 "bktree": ["--bktree", "--cache-size", "0"],
+					 "vector": ["--vector", "--cache-size", "0"],
+					 "symspell": ["--symspell", "2", "--cache-size", "0"],
+					 "cache": ["--vector"],
+					 "qwerty": ["--cache-size", "0"],
+					 "qwerty-vector": ["--vector", "--cache-size", "0"],
+					 "qwerty-qgram": ["--qgram", "--cache-size", "0"]}
+BENCHMARK_DATASETS = ["wikipediatypo.txt", "wikipediatypoclean.txt", "syntheticdata.txt"]
+
+
+def main():
+	if len(sys.argv) > 1 and sys.argv[1] == "--run-one":
+		# Internal mode: benchmark a single backend on a single dataset and print the result as JSON for the parent process
+		print json.dumps(run_benchmark(sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5])))
+		return
+	options = parse_benchmark_options(sys.argv[2:])
+	if len(sys.argv) < 2 or options == None:
+		print "Command should follow format: python benchmark.py 3esl.txt [--backends scan,bktree,...] [--datasets wikipediatypo.txt,...] [--sample <numberOfWords>] [--output results.json] [--compare baseline.json] [--threshold <fraction>]"
+		print "Backends: %s" % ",".join(BENCHMARK_BACKENDS)
+		sys.exit(1)
+	dictionaryFileName = sys.argv[1]
+
+	results = []
+	for dataset in options["datasets"]:
+		for backend in options["backends"]:
+			# Each run gets its own process, so its peak memory isn't mixed up with the other backends'
+			output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--run-one", dictionaryFileName, backend, dataset, str(options["sample"])])
+			result = json.loads(output.splitlines()[-1])
+			print_result(result)
+			results.append(result)
+
+	report = {"dictionary": dictionaryFileName, "sample": options["sample"], "python": platform.python_version(),
+			  "machine": platform.machine(), "time": time.strftime("%Y-%m-%d %H:%M:%S"), "results": results}
+	f = open(options["output"], 'w')
+	json.dump(report, f, indent=2, sort_keys=True)
+	f.close()
+	print "results saved to %s" % options["output"]
+
+	if options["compare"] != None:
+		f = open(options["compare"], 'r')
+		baseline = json.load(f)
+		f.close()
+		regressions = compare_results(baseline["results"], results, options["threshold"])
+		if len(regressions) > 0:
+			print "%d regression(s) against %s (threshold %.0f%%):" % (len(regressions), options["compare"], 100 * options["threshold"])
+			for regression in regressions:
+				print "  " + regression
+			sys.exit(1)
+		print "no regressions against %s (threshold %.0f%%)" % (options["compare"], 100 * options["threshold"])
+
+
+############ Helper functions used in benchmark.py ############
+# Function that reads the command line flags. Returns None if a flag isn't recognized so main can print the usage message
+def parse_benchmark_options(args):
+	options = {"backends": list(BENCHMARK_BACKENDS), "datasets": list(BENCHMARK_DATASETS), "sample": 100,
+			   "output": "benchmark.json", "compare": None, "threshold": 0.1}
+	i = 0
+	while i + 1 < len(args):
+		if args[i] == "--backends":
+			options["backends"] = args[i+1].split(",")
+			for backend in options["backends"]:
+				if backend not in BENCHMARK_OPTIONS:
+					return None
+		elif args[i] == "--datasets":
+			options["datasets"] = args[i+1].split(",")
+		elif args[i] == "--sample" and args[i+1].isdigit():
+			options["sample"] = int(args[i+1])
+		elif args[i] == "--output":
+			options["output"] = args[i+1]
+		elif args[i] == "--compare":
+			options["compare"] = args[i+1]
+		elif args[i] == "--threshold":
+			try:
+				options["threshold"] = float(args[i+1])
+			except ValueError:
+				return None
+		else:
+			return None
+		i += 2
+	if i != len(args):
+		return None
+	return options
+
+# Function that picks sample_size typo/trueword pairs spread evenly through a dataset, so every run sees the same words
+# A sample_size of 0 uses the whole dataset
+def sample_typos(typos, truewords, sample_size):
+	if sample_size == 0 or sample_size >= len(typos):
+		return typos, truewords
+	picks = [i * len(typos) // sample_size for i in range(sample_size)]
+	return [typos[i] for i in picks], [truewords[i] for i in picks]
+
+# Function that corrects every sampled typo of a dataset with one backend, timing each query separately
+# Returns the throughput, latency percentiles, error rate, setup time and peak memory of the process
+def run_benchmark(dictionaryFileName, backend, dataset, sample_size):
+	typos, truewords = sample_typos(*spellcheck.read_typos(dataset), sample_size=sample_size)
+	start = time.time()
+	dictionary = spellcheck.read_dictionary(dictionaryFileName)
+	options = spellcheck.parse_options(BENCHMARK_OPTIONS[backend])
+	index = spellcheck.build_index(options, dictionary)
+	cache = spellcheck.build_cache(options, dictionary)
+	setup_seconds = time.time() - start
+
+	latencies = []
+	error_count = 0
+	start = time.time()
+	for i in range(len(typos)):
+		query_start = time.time()
+		if backend.startswith("qwerty"):
+			corrected_word = spellcheck.experiment_find_closest_word_querty(typos[i], dictionary, 1, 1, "qwerty", index)
+		else:
+			corrected_word = spellcheck.find_closest_word(typos[i], dictionary, index, cache)
+		latencies.append(time.time() - query_start)
+		if corrected_word != truewords[i]:
+			error_count += 1
+	seconds = time.time() - start
+
+	return {"backend": backend, "dataset": os.path.basename(dataset), "words": len(typos),
+			"setup_seconds": setup_seconds, "seconds": seconds,
+			"words_per_sec": len(typos) / seconds if seconds > 0 else 0,
+			"latency_ms": {"p50": 1000 * spellcheck.latency_percentile(latencies, 0.5),
+						   "p90": 1000 * spellcheck.latency_percentile(latencies, 0.9),
+						   "p99": 1000 * spellcheck.latency_percentile(latencies, 0.99),
+						   "max": 1000 * max(latencies or [0])},
+			"error_rate": float(error_count) / len(typos) if len(typos) > 0 else 0,
+			"peak_memory_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+def print_result(result):
+	print "%-14s %-24s %5d words  %9.1f words/sec  p50 %8.2f ms  p99 %8.2f ms  setup %6.2f s  peak %7d KB  error rate %f" % (
+		result["backend"], result["dataset"], result["words"], result["words_per_sec"], result["latency_ms"]["p50"],
+		result["latency_ms"]["p99"], result["setup_seconds"], result["peak_memory_kb"], result["error_rate"])
+
+# Function that compares a run against a baseline run, matching results by backend and dataset
+# A result regresses if its throughput drops, or its p99 latency or peak memory grows, by more than threshold (a fraction),
+# or if its error rate changes at all, since every backend is supposed to give the same corrections as before
+def compare_results(baseline_results, results, threshold):
+	baseline = {}
+	for result in baseline_results:
+		baseline[(result["backend"], result["dataset"])] = result
+	regressions = []
+	for result in results:
+		key = (result["backend"], result["dataset"])
+		if key not in baseline or baseline[key]["words"] != result["words"]:
+			continue
+		old = baseline[key]
+		name = "%s on %s:" % key
+		if result["words_per_sec"] < old["words_per_sec"] * (1 - threshold):
+			regressions.append("%s words/sec %.1f -> %.1f" % (name, old["words_per_sec"], result["words_per_sec"]))
+		if result["latency_ms"]["p99"] > old["latency_ms"]["p99"] * (1 + threshold):
+			regressions.append("%s p99 latency %.2f ms -> %.2f ms" % (name, old["latency_ms"]["p99"], result["latency_ms"]["p99"]))
+		if result["peak_memory_kb"] > old["peak_memory_kb"] * (1 + threshold):
+			regressions.append("%s peak memory %d KB -> %d KB" % (name, old["peak_memory_kb"], result["peak_memory_kb"]))
+		if result["error_rate"] != old["error_rate"]:
+			regressions.append("%s error rate %f -> %f" % (name, old["error_rate"], result["error_rate"]))
+	return regressions
+
+
+if __name__ == "__main__":
+	main()
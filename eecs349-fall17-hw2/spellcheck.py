@@ -1,77 +1,255 @@
 import io, sys, os
 import csv
+import math
+import collections
+import heapq
+import multiprocessing
+import re
+import mmap
+import struct
+import cPickle
 import numpy as np
 import matplotlib.pyplot as plt
 import time
+from spellindex import levenshtein_distance, wagner_fischer_distance, length_difference_cost, bounded_levenshtein_distance, \
+	build_char_masks, bit_parallel_levenshtein_distance, select_closest_word, BKTreeNode, BKTree, single_edit_variants, \
+	build_bk_tree, VectorDictionary, SymSpellIndex, deletion_variants, QGramIndex
 
 
 def main():
-	if len(sys.argv) != 3:
-		print "Command should follow format: python spellcheck.py <toBeSpellCheckedFileName> 3esl.txt"
+	# Compile the dictionary into a binary file that later runs can memory-map instead of re-parsing
+	if len(sys.argv) >= 2 and sys.argv[1] == "compile-dictionary":
+		if len(sys.argv) != 4:
+			print "Command should follow format: python spellcheck.py compile-dictionary 3esl.txt <compiledFileName>"
+			sys.exit(1)
+		dictionary = read_dictionary(sys.argv[2])
+		compile_dictionary(dictionary, sys.argv[3])
+		print "compiled dictionary saved"
+		return
+	options = parse_options(sys.argv[3:])
+	if len(sys.argv) < 3 or options == None:
+		print "Command should follow format: python spellcheck.py <toBeSpellCheckedFileName> 3esl.txt [--bktree | --vector | --symspell <maxDistance> | --qgram | --load-index <indexFileName>] [--save-index <indexFileName>] [--workers <numberOfProcesses>] [--cache-size <numberOfWords>]"
+		print "3esl.txt can also be a file made by: python spellcheck.py compile-dictionary 3esl.txt <compiledFileName>"
 		sys.exit(1)
 	toBeSpellCheckedFileName = sys.argv[1]
 	dictionaryFileName = sys.argv[2]
 
-	wordsToSpellCheck = read_input(toBeSpellCheckedFileName)
-	dictionary = read_dictionary(dictionaryFileName)
-	corrected_words = [] # list of words that were spell-checked
-	all_words = [] # list of all words (including both those that were spell checked and the non-alphanumeric words that weren't)
-
-	# Go through list of words to spell check and find the closest word in the dictionary
-	for wordToSC in wordsToSpellCheck:
-		# corrected_word = spell_check(wordToSC[0], dictionary) # take the 0th element of the word because wordsToSpellCheck contains the associated correction in the 1st element)
-		# If the word to spell check is actually a word, then spell check it
-		if wordToSC.isalnum():
-			corrected_word = find_closest_word(wordToSC, dictionary)
-			if corrected_word == "":
-				# This happens when the word to spell check is a number. 
-				# It's alphanumeric so we actually spell check it, but nothing in the dictionary matches it so we get a blank string back
-				# Rather than adding a blank string to our output, just set it to the original number
-				corrected_word = wordToSC
-			# Add the curr_corrected string to the list of corrected words and to the list of all words
-			corrected_words.append(corrected_word)
-			all_words.append(corrected_word)
-		# add the word (which is non-alphanumeric) to the list of all words
-		else:
-			all_words.append(wordToSC)
+	start = time.time()
+	if options["workers"] > 1:
+		# Each worker process loads the dictionary and builds (or loads) the index itself, so the parent only needs them to save the index
+		if options["save_index"] != None:
+			save_index(build_index(options, read_dictionary(dictionaryFileName)), options["save_index"])
+		word_count = parallel_spell_check(toBeSpellCheckedFileName, dictionaryFileName, options)
+	else:
+		dictionary = read_dictionary(dictionaryFileName)
+		# Optionally build (or load) a search index over the dictionary so every word doesn't need a full scan
+		index = build_index(options, dictionary)
+		if options["save_index"] != None:
+			save_index(index, options["save_index"])
+		cache = build_cache(options, dictionary)
 
-	# Write the output to a file
-	with open("corrected.txt", "w") as out_file:
-		for word in all_words:
-			out_file.write(word)
+		# Go through the words to spell check as they are read and find the closest word in the dictionary
+		# Each word (or non-alphanumeric delimiter) is written out as soon as it's corrected, so the whole file never has to be in memory
+		word_count = 0
+		with open("corrected.txt", "w") as out_file:
+			for wordToSC in iter_input(toBeSpellCheckedFileName):
+				if wordToSC.isalnum():
+					word_count += 1
+				out_file.write(correct_word(wordToSC, dictionary, index, cache))
 	print "output file saved"
+	elapsed = time.time() - start
+	print "spell checked %d words in %.1f seconds (%.0f words/second)" % (word_count, elapsed, word_count / max(elapsed, 1e-9))
+	if options["workers"] == 1 and cache != None:
+		cache.print_stats()
 
 
 ############ Helper functions used in spellcheck.py ############
-# Function that reads the input typo file and returns the words contained
-# Words are delimited by any non-alphanumeric character
-def read_input(inputFile):
+# Function that reads the optional flags that follow the input and dictionary file names
+# Returns None if a flag isn't recognized (or is missing its value) so main can print the usage message
+def parse_options(args):
+	options = {"index": None, "max_distance": 2, "load_index": None, "save_index": None, "workers": 1, "cache_size": 100000}
+	i = 0
+	while i < len(args):
+		if args[i] == "--bktree":
+			options["index"] = "bktree"
+		elif args[i] == "--vector":
+			options["index"] = "vector"
+		elif args[i] == "--symspell" and i + 1 < len(args) and args[i+1].isdigit():
+			options["index"] = "symspell"
+			options["max_distance"] = int(args[i+1])
+			i += 1
+		elif args[i] == "--qgram":
+			options["index"] = "qgram"
+		elif args[i] == "--load-index" and i + 1 < len(args):
+			options["index"] = "load"
+			options["load_index"] = args[i+1]
+			i += 1
+		elif args[i] == "--save-index" and i + 1 < len(args):
+			options["save_index"] = args[i+1]
+			i += 1
+		elif args[i] == "--workers" and i + 1 < len(args) and args[i+1].isdigit() and int(args[i+1]) > 0:
+			options["workers"] = int(args[i+1])
+			i += 1
+		elif args[i] == "--cache-size" and i + 1 < len(args) and args[i+1].isdigit():
+			options["cache_size"] = int(args[i+1])
+			i += 1
+		else:
+			return None
+		i += 1
+	return options
+
+# Function that builds the correction cache main uses, unless it was turned off with --cache-size 0
+def build_cache(options, dictionary):
+	if options["cache_size"] == 0:
+		return None
+	return CorrectionCache(dictionary, options["cache_size"])
+
+# Function that builds the search index chosen on the command line, or loads a prebuilt one. Returns None for a plain linear scan
+def build_index(options, dictionary):
+	if options["index"] == "bktree":
+		return build_bk_tree(dictionary)
+	elif options["index"] == "vector":
+		return VectorDictionary(dictionary)
+	elif options["index"] == "symspell":
+		return SymSpellIndex(dictionary, options["max_distance"])
+	elif options["index"] == "qgram":
+		return QGramIndex(dictionary)
+	elif options["index"] == "load":
+		return load_index(options["load_index"])
+	return None
+
+# Compiled pattern that splits text into runs of alphanumeric characters (words) and single non-alphanumeric characters (delimiters)
+TOKEN_PATTERN = re.compile(r'[a-zA-Z0-9]+|[^a-zA-Z0-9]')
+
+# Function that reads the input file one line at a time and yields the words it contains, along with the delimiters between them
+# Words are delimited by any non-alphanumeric character. The delimiters are yielded too so that when creating the corrected.txt output
+# we can include them as they were originally. csv.reader is still used to split lines so commas and quotes are handled as before
+def iter_input(inputFile):
+	first_row = True
+	for row in iter_input_rows(inputFile):
+		# add the newline character between lines (there's no extra one after the last line)
+		if not first_row:
+			yield "\n"
+		first_row = False
+		for token in tokenize_row(row):
+			yield token
+
+# Function that reads the input file one line (csv row) at a time
+def iter_input_rows(inputFile):
 	f = open(inputFile, 'rU')
-	words = []
 	# Create the reader object
 	reader = csv.reader(f)
 	for row in reader:
-		for part in row:
-			temp_word = "" # This is to keep track of the current "sub"-word
-			for char in part:
-				# check whether the character is alphanumeric
-				if char.isalnum():
-					temp_word += char
-				else:
-					# if not alphanumeric, it's a delimiter so append the temp_word string to the list of words and reset it
-					words.append(temp_word)
-					temp_word = ""
-					# also append the non-alphanumeric character. This is done so that when creating the corrected.txt output we can include the non-alphanumeric characters as they were originally
-					words.append(char)
-			if temp_word != "": # make sure we don't leave off any strings at the end of the line after the last non-alphanumeric charcter
-				words.append(temp_word)
-		words.append("\n") #add the newline character at the end of the line
-	words = words[0:len(words)-1] # remove the extra newline character at the end
-	return words
+		yield row
+
+# Function that yields the words and delimiters in one row of the input file
+def tokenize_row(row):
+	for part in row:
+		for token in TOKEN_PATTERN.findall(part):
+			yield token
+
+# Function that reads the input typo file and returns the words contained (and the delimiters between them) as one list
+def read_input(inputFile):
+	return list(iter_input(inputFile))
+
+# Function that returns what a word (or delimiter) from the input should be written out as in corrected.txt
+def correct_word(wordToSC, dictionary, index=None, cache=None):
+	# If the word to spell check is actually a word, then spell check it
+	if not wordToSC.isalnum():
+		return wordToSC
+	corrected_word = find_closest_word(wordToSC, dictionary, index, cache)
+	if corrected_word == "":
+		# This happens when the word to spell check is a number.
+		# It's alphanumeric so we actually spell check it, but nothing in the dictionary matches it so we get a blank string back
+		# Rather than adding a blank string to our output, just set it to the original number
+		corrected_word = wordToSC
+	return corrected_word
+
+# Function that spell checks the input file using a pool of worker processes and writes corrected.txt. Returns the number of words checked
+# The input is split into shards of whole lines, each worker corrects a shard at a time, and the shards are written back out in their original order.
+# Only a bounded number of shards are in flight at once, so memory still doesn't grow with the size of the file
+# Unless shard_bytes is given, it comes from choose_shard_bytes
+def parallel_spell_check(toBeSpellCheckedFileName, dictionaryFileName, options, shard_bytes=None):
+	if shard_bytes == None:
+		shard_bytes = choose_shard_bytes(toBeSpellCheckedFileName, options["workers"])
+	pool = multiprocessing.Pool(options["workers"], init_spell_check_worker, (dictionaryFileName, options))
+	pending = collections.deque()
+	word_count = 0
+	first_shard = True
+	with open("corrected.txt", "w") as out_file:
+		for shard in iter_shards(iter_input_rows(toBeSpellCheckedFileName), shard_bytes):
+			pending.append(pool.apply_async(correct_shard, (shard,)))
+			# Write out the oldest shards once enough are queued up to keep every worker busy
+			while len(pending) > 4 * options["workers"] or (len(pending) > 0 and pending[0].ready()):
+				first_shard, shard_words = write_shard(out_file, pending.popleft().get(), first_shard)
+				word_count += shard_words
+		while len(pending) > 0:
+			first_shard, shard_words = write_shard(out_file, pending.popleft().get(), first_shard)
+			word_count += shard_words
+	pool.close()
+	pool.join()
+	return word_count
+
+# Function that picks how many bytes of the input go in a shard so every worker gets about four shards, which keeps them all busy
+# even when some shards take longer than others, but at most max_shard_bytes (plus the row that takes a shard over it) so a shard
+# of a big file still doesn't hold much of it in memory
+# The size comes from the file system, so the file isn't read before the shards are
+def choose_shard_bytes(inputFile, workers, max_shard_bytes=65536):
+	return max(1, min(max_shard_bytes, int(math.ceil(os.path.getsize(inputFile) / (4.0 * workers)))))
+
+# Function that groups rows into lists of whole rows holding about shard_bytes bytes of the input each (a row's fields and the
+# separators between them). A shard is closed as soon as it reaches shard_bytes, so it only goes over by at most its last row
+def iter_shards(rows, shard_bytes):
+	shard = []
+	size = 0
+	for row in rows:
+		shard.append(row)
+		size += sum([len(part) for part in row]) + len(row)
+		if size >= shard_bytes:
+			yield shard
+			shard = []
+			size = 0
+	if len(shard) > 0:
+		yield shard
+
+# Function that writes a corrected shard to the output, with a newline between it and the shard before it
+def write_shard(out_file, result, first_shard):
+	text, shard_words = result
+	if not first_shard:
+		out_file.write("\n")
+	out_file.write(text)
+	return False, shard_words
+
+# The dictionary, index and correction cache each worker process uses, set up once by init_spell_check_worker
+worker_dictionary = None
+worker_index = None
+worker_cache = None
+
+def init_spell_check_worker(dictionaryFileName, options):
+	global worker_dictionary, worker_index, worker_cache
+	worker_dictionary = read_dictionary(dictionaryFileName)
+	worker_index = build_index(options, worker_dictionary)
+	worker_cache = build_cache(options, worker_dictionary)
+
+# Function run by a worker process to correct one shard of rows. Returns the corrected text of the shard and the number of words in it
+def correct_shard(shard):
+	lines = []
+	shard_words = 0
+	for row in shard:
+		line = []
+		for wordToSC in tokenize_row(row):
+			if wordToSC.isalnum():
+				shard_words += 1
+			line.append(correct_word(wordToSC, worker_dictionary, worker_index, worker_cache))
+		lines.append("".join(line))
+	return "\n".join(lines), shard_words
 
 # Function that reads the input file and returns the words contained
 # dictionary word lists have one word (or phrase) per line
+# A dictionary made by compile_dictionary is memory-mapped instead of parsed (see CompiledDictionary)
 def read_dictionary(inputFile):
+	if is_compiled_dictionary(inputFile):
+		return CompiledDictionary(inputFile)
 	f = open(inputFile, 'rU')
 	words = []
 	# Create the reader object
@@ -82,17 +260,31 @@ def read_dictionary(inputFile):
 
 
 # Function that finds the closest word in a dictionary to a given input string. Calls the function to calculate Levenshtein distance
-def find_closest_word(string1, dictionary):
-	# Initialize cost variables
-	insertion_cost = 1
-	deletion_cost = 1
-	substitution_cost = 1
+# If a search index (a BK-tree, VectorDictionary or SymSpellIndex) is given it is asked first, and the linear scan is only used when the index can't answer
+# If a CorrectionCache is given, words that are in the dictionary or were already looked up are answered from it
+def find_closest_word(string1, dictionary, index=None, cache=None):
+	if cache != None:
+		closest_word = cache.lookup(string1, (1, 1, 1))
+		if closest_word == None:
+			closest_word = find_closest_word(string1, dictionary, index)
+			cache.store(string1, (1, 1, 1), closest_word)
+		return closest_word
+	if index != None:
+		closest_word = index.closest_word(string1, dictionary)
+		if closest_word != None:
+			return closest_word
+	# All costs are 1 here, so the bit-parallel kernel can be used directly with the query's character masks built only once
+	char_masks = build_char_masks(string1)
+	length1 = len(string1)
 	closest_word = ""
 	# Initialize min distance
-	min_distance = levenshtein_distance(string1, dictionary[0][0], deletion_cost, insertion_cost, substitution_cost)
+	min_distance = bit_parallel_levenshtein_distance(char_masks, length1, dictionary[0][0])
 	# Go through each word in dicationary and calculate the distance, checking to see if it's smaller than the current smallest distance
 	for dict_word in dictionary:
-		curr_distance = levenshtein_distance(string1, dict_word[0], deletion_cost, insertion_cost, substitution_cost)
+		# The distance is at least the length difference, so words whose length is too far off can't be any closer
+		if abs(length1 - len(dict_word[0])) >= min_distance > 0:
+			continue
+		curr_distance = bit_parallel_levenshtein_distance(char_masks, length1, dict_word[0])
 		if curr_distance == 0: # we found a perfect match
 			return dict_word[0]
 		elif curr_distance < min_distance:
@@ -100,28 +292,229 @@ def find_closest_word(string1, dictionary):
 			closest_word = dict_word[0]
 	return closest_word
 
-# Function to compute the Levenshtein distance between two strings, built from pseudo code for Wagner and Fischer algorithm
-def levenshtein_distance(string1, string2, deletion_cost, insertion_cost, substitution_cost):
-	distance = 0
-	# Initialize the distance matrix
-	m = len(string1) + 1
-	n = len(string2) + 1
-	M = np.zeros((m, n))
-	for i in range(m):
-		M[i,0] = i * deletion_cost # distance of any 1st string to an empty 2nd string
-	for j in range(n):
-		M[0,j] = j * insertion_cost # distance of any 2nd string to an empty 1st string
-	# Go through matrix and calculate distances
-	for j in range(1, n):
-		for i in range(1, m):
-			# check if strings are the same (capitalization doesn't matter)
-			if string1[i-1].lower() == string2[j-1].lower():
-				M[i,j] = M[i-1, j-1] # no operation cost, because they match
-			else:
-				M[i,j] = min(M[i-1,j] + deletion_cost, M[i, j-1] + insertion_cost, M[i-1,j-1] + substitution_cost)
-	distance = M[m-1,n-1]
-	return distance
+# Function that finds the k dictionary words closest to a given input string, as a list of (word, distance) pairs from closest to furthest
+# Words at the same distance are listed in dictionary order, and words further than max_distance (if given) are left out.
+# Unlike find_closest_word, every word counts, not only the ones closer than the first dictionary word.
+# The k best words so far are kept in a heap whose root is the current k-th best, and once the heap is full its distance is the cutoff:
+# words whose length is too far off are skipped and the bounded distance gives up early, so k suggestions cost about as much as one answer.
+# Costs default to the unit-cost distance; if a keyboard layout is given, substitution costs come from its table instead of substitution_cost
+def find_closest_words(string1, dictionary, k=5, max_distance=None, insertion_cost=1, deletion_cost=1, substitution_cost=1, layout=None):
+	if k <= 0:
+		return []
+	unit_costs = layout == None and insertion_cost == 1 and deletion_cost == 1 and substitution_cost == 1
+	substitution_table = None
+	if layout != None:
+		substitution_table = get_keyboard_table(layout)
+		substitution_cost = None
+	if unit_costs:
+		char_masks = build_char_masks(string1)
+	length1 = len(string1)
+	cutoff = float('inf')
+	if max_distance != None:
+		cutoff = max_distance
+	heap = [] # entries are (-distance, -index, word), so the root is the furthest word, and the later one among equally far words
+	for i in range(len(dictionary)):
+		dict_word = dictionary[i][0]
+		full = len(heap) == k
+		# Once the heap is full a word has to be strictly closer than the k-th best to get in, since that one comes earlier in the dictionary
+		length_cost = length_difference_cost(length1, len(dict_word), deletion_cost, insertion_cost)
+		if length_cost > cutoff or (full and length_cost == cutoff):
+			continue
+		if unit_costs:
+			curr_distance = bit_parallel_levenshtein_distance(char_masks, length1, dict_word)
+		else:
+			curr_distance = bounded_levenshtein_distance(string1, dict_word, deletion_cost, insertion_cost, substitution_cost, cutoff, substitution_table)
+		if curr_distance > cutoff or (full and curr_distance == cutoff):
+			continue
+		if full:
+			heapq.heapreplace(heap, (-curr_distance, -i, dict_word))
+		else:
+			heapq.heappush(heap, (-curr_distance, -i, dict_word))
+		if len(heap) == k:
+			cutoff = -heap[0][0]
+	return [(word, -distance) for distance, index, word in sorted(heap, reverse=True)]
+
+# Functions that save a built search index to a file and load it back, so it doesn't have to be rebuilt on every run
+# A loaded index is unpickled into the memory of the process that loads it, so it isn't shared between processes the way
+# the pages of a compiled dictionary are, and loading it still takes a good part of the time building it does
+def save_index(index, indexFileName):
+	with open(indexFileName, "wb") as out_file:
+		out_file.write(pickle_index(index))
+
+# Function that pickles a search index. The index classes are defined in spellindex, so the pickle can be loaded by any
+# program that can import it, whether it was written by spellcheck.py run as a script or by a program importing spellcheck
+def pickle_index(index):
+	return cPickle.dumps(index, cPickle.HIGHEST_PROTOCOL)
+
+# Function that unpickles an index saved by save_index. Files written before indexes were pickled
+# from the spellcheck module refer to __main__, which can't be loaded here, so they have to be made again
+def unpickle_index(data, fileName):
+	try:
+		return cPickle.loads(data)
+	except AttributeError:
+		raise ValueError("the index in %s was saved from __main__ and can't be loaded, so it has to be made again" % fileName)
 
+def load_index(indexFileName):
+	with open(indexFileName, "rb") as in_file:
+		return unpickle_index(in_file.read(), indexFileName)
+
+#### Class used to cache corrections
+# Real text repeats the same words over and over, so two shortcuts are checked before searching the dictionary:
+#  - an exact-match table of every lowercased dictionary word. When all costs are positive, a word that's in the dictionary is at distance 0
+#    from exactly the entries that lowercase to it, so the linear scan would return the first of those entries
+#  - a bounded least-recently-used memo of earlier corrections, keyed by the lowercased word and the (insertion, deletion, substitution) costs.
+#    Every distance ignores capitalization, so the correction doesn't depend on how the word was capitalized
+# The hit and miss counters can be used to choose maxsize
+class CorrectionCache:
+	def __init__(self, dictionary, maxsize=100000):
+		self.maxsize = maxsize
+		self.exact_words = {} # lowercased word -> first dictionary entry that lowercases to it
+		for dict_word in dictionary:
+			lower_word = dict_word[0].lower()
+			if lower_word not in self.exact_words:
+				self.exact_words[lower_word] = dict_word[0]
+		self.memo = collections.OrderedDict() # oldest entries first
+		self.exact_hits = 0
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	# Function that returns the cached correction for a word under the given costs, or None if it has to be searched for
+	def lookup(self, word, costs):
+		lower_word = word.lower()
+		if min(costs) > 0 and lower_word in self.exact_words:
+			self.exact_hits += 1
+			return self.exact_words[lower_word]
+		key = (lower_word, costs)
+		if key in self.memo:
+			self.hits += 1
+			# move the entry to the end, since it's now the most recently used
+			closest_word = self.memo.pop(key)
+			self.memo[key] = closest_word
+			return closest_word
+		self.misses += 1
+		return None
+
+	# Function that remembers a correction, evicting the least recently used one if the memo is full
+	def store(self, word, costs, closest_word):
+		if self.maxsize <= 0:
+			return
+		self.memo[(word.lower(), costs)] = closest_word
+		if len(self.memo) > self.maxsize:
+			self.memo.popitem(last=False)
+			self.evictions += 1
+
+	def stats(self):
+		lookups = self.exact_hits + self.hits + self.misses
+		return {"exact_hits": self.exact_hits, "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+				"size": len(self.memo), "maxsize": self.maxsize, "hit_rate": float(self.exact_hits + self.hits) / max(lookups, 1)}
+
+	def print_stats(self):
+		stats = self.stats()
+		print "cache: %d exact matches, %d hits, %d misses (%.1f%% hit rate), %d evictions, %d of %d entries used" % (stats["exact_hits"], stats["hits"], stats["misses"], 100 * stats["hit_rate"], stats["evictions"], stats["size"], stats["maxsize"])
+
+#### Compiled dictionary file format
+# A header (magic string, version, number of words, and the start and size of each section) followed by these sections, each 8-byte aligned:
+#  - offsets: uint32 start of each word in the words section, plus the end of the last word
+#  - words: every dictionary word as written in the dictionary, in one contiguous byte buffer
+#  - bucket table: uint64 (length, number of words, start of indices, start of codes) for each word length, relative to the bucket data
+#  - bucket data: for each length, the uint32 dictionary indices of the words of that length and their lowercased bytes, one contiguous
+#    (number of words, length) buffer. Together these hold every lowercased word grouped by length, ready for VectorDictionary
+# Search indexes aren't stored in it, since they are Python objects that every process would have to unpickle into its own memory
+# (see save_index and load_index)
+COMPILED_DICTIONARY_MAGIC = "SPELLDIC"
+COMPILED_DICTIONARY_VERSION = 2
+COMPILED_DICTIONARY_HEADER = struct.Struct("<8sII" + "QQ" * 4)
+
+# Function that returns whether a file is a compiled dictionary (rather than a word list)
+def is_compiled_dictionary(inputFile):
+	with open(inputFile, "rb") as in_file:
+		return in_file.read(len(COMPILED_DICTIONARY_MAGIC)) == COMPILED_DICTIONARY_MAGIC
+
+# Function that writes the output of read_dictionary to a compiled dictionary file
+def compile_dictionary(dictionary, compiledFileName):
+	words = [dict_word[0] for dict_word in dictionary]
+	offsets = np.zeros(len(words) + 1, dtype=np.uint32)
+	offsets[1:] = np.cumsum([len(word) for word in words])
+	buckets = {}
+	for i in range(len(words)):
+		buckets.setdefault(len(words[i]), []).append(i)
+	bucket_table = []
+	bucket_data = []
+	data_size = 0
+	for length in sorted(buckets.keys()):
+		indices = np.array(buckets[length], dtype=np.uint32).tostring()
+		codes = "".join([words[i].lower() for i in buckets[length]])
+		bucket_table.append([length, len(buckets[length]), data_size, data_size + len(pad_section(indices))])
+		bucket_data.append(pad_section(indices))
+		bucket_data.append(pad_section(codes))
+		data_size += len(pad_section(indices)) + len(pad_section(codes))
+	sections = [offsets.tostring(), "".join(words), np.array(bucket_table, dtype=np.uint64).tostring(), "".join(bucket_data)]
+	# Lay the sections out one after another after the header, keeping track of where each one starts
+	positions = []
+	position = COMPILED_DICTIONARY_HEADER.size
+	for section in sections:
+		positions.extend([position, len(section)])
+		position += len(pad_section(section))
+	with open(compiledFileName, "wb") as out_file:
+		out_file.write(COMPILED_DICTIONARY_HEADER.pack(COMPILED_DICTIONARY_MAGIC, COMPILED_DICTIONARY_VERSION, len(words), *positions))
+		for section in sections:
+			out_file.write(pad_section(section))
+
+# Function that pads a section with zero bytes to a multiple of 8 bytes
+def pad_section(section):
+	return section + "\0" * (-len(section) % 8)
+
+#### Class used to read a compiled dictionary through mmap
+# It behaves like the output of read_dictionary (len, indexing and iteration give one-element [word] lists), so it can be passed
+# anywhere a dictionary is used. Nothing is parsed when it's opened: the offsets and the length buckets are arrays over the mapped
+# file, so several processes using the same file share its pages. The words are only cut out of the file the first time one is
+# asked for, all at once, and kept as a list for the rest of the process, so a scan over the dictionary costs what it does with read_dictionary
+class CompiledDictionary:
+	def __init__(self, compiledFileName):
+		self.fileName = compiledFileName
+		self.file = open(compiledFileName, "rb")
+		self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		header = COMPILED_DICTIONARY_HEADER.unpack_from(self.map, 0)
+		if header[0] != COMPILED_DICTIONARY_MAGIC or header[1] != COMPILED_DICTIONARY_VERSION:
+			raise ValueError("%s is not a version %d compiled dictionary" % (compiledFileName, COMPILED_DICTIONARY_VERSION))
+		self.size = header[2]
+		offsets_start, offsets_size, self.words_start, words_size, table_start, table_size, data_start, data_size = header[3:]
+		self.offsets = np.frombuffer(self.map, dtype=np.uint32, count=self.size + 1, offset=offsets_start)
+		self.entries = None # the [word] lists, once they are needed (see words)
+		bucket_table = np.frombuffer(self.map, dtype=np.uint64, count=table_size // 8, offset=table_start).reshape(-1, 4)
+		self.lengths = []
+		self.bucket_indices = {}
+		self.bucket_codes = {}
+		for length, count, indices_start, codes_start in bucket_table.tolist():
+			self.lengths.append(length)
+			self.bucket_indices[length] = np.frombuffer(self.map, dtype=np.uint32, count=count, offset=data_start + indices_start)
+			self.bucket_codes[length] = np.frombuffer(self.map, dtype=np.uint8, count=count * length, offset=data_start + codes_start).reshape(count, length)
+
+	def __len__(self):
+		return self.size
+
+	# Function that returns every word as a one-element [word] list, in dictionary order, cutting them out of the file the first time
+	def words(self):
+		if self.entries == None:
+			offsets = self.offsets.tolist()
+			words = self.map[self.words_start:self.words_start + offsets[-1]]
+			self.entries = [[words[offsets[i]:offsets[i+1]]] for i in xrange(self.size)]
+		return self.entries
+
+	# An index or a slice gives the same as indexing or slicing the output of read_dictionary
+	def __getitem__(self, i):
+		return self.words()[i]
+
+	def __iter__(self):
+		return iter(self.words())
+
+	# A compiled dictionary is sent to worker processes by file name, and each of them maps the file again
+	def __getstate__(self):
+		return self.fileName
+
+	def __setstate__(self, compiledFileName):
+		self.__init__(compiledFileName)
 
 ############ End helper functions used in spellcheck.py ############
 
@@ -131,7 +524,9 @@ def levenshtein_distance(string1, string2, deletion_cost, insertion_cost, substi
 # Function that calculates the error rate for a set of typos, truewords, and dictionary words by comparing
 # whether the corrected typo (calculated using the spell_check function) matches the corresponding true word.
 # The function also tracks the time it takes to measure the error for all of the data.
-def measure_error(typos, truewords, dictionarywords):
+# An optional search index (e.g. from build_bk_tree or VectorDictionary) can be passed in to avoid scanning the whole dictionary for every typo,
+# and an optional CorrectionCache to avoid looking up repeated typos (and correctly spelled words) more than once.
+def measure_error(typos, truewords, dictionarywords, index=None, cache=None):
 	start = time.time()
 	if len(typos) == 0: # Check to make sure that we actually have data
 		return 0
@@ -140,7 +535,7 @@ def measure_error(typos, truewords, dictionarywords):
 	for i in range(len(typos)):
 		if i % 50 == 0:
 			print "testing word number %d" % i
-		corrected_word = find_closest_word(typos[i], dictionarywords)
+		corrected_word = find_closest_word(typos[i], dictionarywords, index, cache)
 		# Increment error count if the corrected word is different than the true word
 		if corrected_word != truewords[i]:
 			error_count += 1
@@ -148,19 +543,36 @@ def measure_error(typos, truewords, dictionarywords):
 	error_rate = float(error_count) / float(len(typos))
 	print "time elapsed = %.1f seconds" % (time.time() - start)
 	print "error rate is: %f" % error_rate
+	if cache != None:
+		cache.print_stats()
 	return error_rate
 
-# Function to compute the Levenshtein distance between two strings using the Manhattan distance (distance in rows + distance in columns) between two keys as the substitution cost
-# After determining the substitution cost, it repeats the same code found in the levenshtein_distance function
-def qwerty_levenshtein_distance(string1, string2, deletion_cost, insertion_cost):
-	# Initialize matrix
-	# '.' is used as a placeholder in the 3rd and 4th rows so that the matrix is a square (4x10)
-	qwerty_matrix = [['1', '2', '3', '4', '5', '6', '7', '8', '9', '0'],
-					 ['q', 'w', 'e', 'r', 't', 'y', 'u', 'i', 'o', 'p'], 
-					 ['a', 's', 'd', 'f', 'g', 'h', 'j', 'k', 'l', '.'], 
-					 ['z', 'x', 'c', 'v', 'b', 'n', 'm', '.', '.', '.']]
-	substitution_cost = 1
-	### Levenshtein distance algorithm
+# Function that returns the given percentile (a fraction between 0 and 1) of a list of latencies, using the nearest-rank method
+def latency_percentile(latencies, fraction):
+	if len(latencies) == 0:
+		return 0
+	ordered = sorted(latencies)
+	rank = int(math.ceil(fraction * len(ordered))) - 1
+	return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+# Function that reads a typo file (one "typo<tab>trueword" pair per line) and returns the list of typos and the list of true words
+# The synthetic typos can contain quotes and carriage returns, so lines are split by hand rather than with csv.reader
+def read_typos(inputFile):
+	f = open(inputFile, 'rb')
+	typos = []
+	truewords = []
+	for line in f:
+		line = line.rstrip('\n')
+		if line.endswith('\r'):
+			line = line[:-1]
+		parts = line.split('\t')
+		typos.append(parts[0])
+		truewords.append(parts[1])
+	return typos, truewords
+
+# The original Levenshtein distance, which fills in the whole distance matrix as a NumPy array one cell at a time
+# It is no longer used to spell check, but it is kept as the reference check_levenshtein_kernel compares the faster distances against
+def matrix_levenshtein_distance(string1, string2, deletion_cost, insertion_cost, substitution_cost):
 	distance = 0
 	# Initialize the distance matrix
 	m = len(string1) + 1
@@ -173,53 +585,129 @@ def qwerty_levenshtein_distance(string1, string2, deletion_cost, insertion_cost)
 	# Go through matrix and calculate distances
 	for j in range(1, n):
 		for i in range(1, m):
+			# check if strings are the same (capitalization doesn't matter)
 			if string1[i-1].lower() == string2[j-1].lower():
 				M[i,j] = M[i-1, j-1] # no operation cost, because they match
 			else:
-				substitution_cost = qwerty_Manhattan_distance(qwerty_matrix, string1[i-1].lower(), string2[j-1].lower())
 				M[i,j] = min(M[i-1,j] + deletion_cost, M[i, j-1] + insertion_cost, M[i-1,j-1] + substitution_cost)
 	distance = M[m-1,n-1]
 	return distance
 
-# Function to compute the Manhattan distance between two letters. Called by qwerty_levenshtein_distance
-def qwerty_Manhattan_distance(qwerty_matrix, letter1, letter2):
-	# Non alpha-numeric characters should be considered as word delimiters so we don't need to worry about that
-	letter1_row = -1
-	letter1_col = -1
-	letter2_row = -1
-	letter2_col = -1
-	# Find letter positions
-	# First find the row
-	for i in range(len(qwerty_matrix)):
-		if letter1 in qwerty_matrix[i]:
-			letter1_row = i
-			# Then find the column
-			for j in range(len(qwerty_matrix[i])):
-				if qwerty_matrix[i][j] == letter1:
-					letter1_col = j
-					break
-		if letter2 in qwerty_matrix[i]:
-			letter2_row = i
-			# Then find the column
-			for j in range(len(qwerty_matrix[i])):
-				if qwerty_matrix[i][j] == letter2:
-					letter2_col = j
-					break
-	# Calculate the distance
-	row_dist = abs(letter1_row - letter2_row)
-	col_dist = abs(letter1_col - letter2_col)
-	return row_dist + col_dist
+# Function that checks the bit-parallel kernel against the original NumPy matrix Levenshtein distance on every typo/trueword pair in a typo file,
+# as well as against a sample of dictionary words, and prints how long each took
+def check_levenshtein_kernel(typoFileName, dictionarywords, sample_size=50):
+	typos, truewords = read_typos(typoFileName)
+	pairs = []
+	for i in range(len(typos)):
+		pairs.append((typos[i], truewords[i]))
+		for dict_word in dictionarywords[i % len(dictionarywords):i % len(dictionarywords) + sample_size]:
+			pairs.append((typos[i], dict_word[0]))
+	start = time.time()
+	matrix_distances = [matrix_levenshtein_distance(string1, string2, 1, 1, 1) for string1, string2 in pairs]
+	matrix_time = time.time() - start
+	start = time.time()
+	kernel_distances = [levenshtein_distance(string1, string2, 1, 1, 1) for string1, string2 in pairs]
+	kernel_time = time.time() - start
+	mismatches = 0
+	for i in range(len(pairs)):
+		if matrix_distances[i] != kernel_distances[i]:
+			mismatches += 1
+	print "checked %d pairs, %d mismatches" % (len(pairs), mismatches)
+	print "NumPy matrix time = %.2f seconds, bit-parallel time = %.2f seconds (%.1fx faster)" % (matrix_time, kernel_time, matrix_time / kernel_time)
+	return mismatches
+
+# Keyboard layouts, given as one list of keys per row of the keyboard
+# '.' is used as a placeholder in the 3rd and 4th QWERTY rows so that the matrix is a square (4x10)
+QWERTY_LAYOUT = [['1', '2', '3', '4', '5', '6', '7', '8', '9', '0'],
+				 ['q', 'w', 'e', 'r', 't', 'y', 'u', 'i', 'o', 'p'],
+				 ['a', 's', 'd', 'f', 'g', 'h', 'j', 'k', 'l', '.'],
+				 ['z', 'x', 'c', 'v', 'b', 'n', 'm', '.', '.', '.']]
+AZERTY_LAYOUT = [['1', '2', '3', '4', '5', '6', '7', '8', '9', '0'],
+				 ['a', 'z', 'e', 'r', 't', 'y', 'u', 'i', 'o', 'p'],
+				 ['q', 's', 'd', 'f', 'g', 'h', 'j', 'k', 'l', 'm'],
+				 ['w', 'x', 'c', 'v', 'b', 'n']]
+DVORAK_LAYOUT = [['1', '2', '3', '4', '5', '6', '7', '8', '9', '0'],
+				 ["'", ',', '.', 'p', 'y', 'f', 'g', 'c', 'r', 'l'],
+				 ['a', 'o', 'e', 'u', 'i', 'd', 'h', 't', 'n', 's'],
+				 [';', 'q', 'j', 'k', 'x', 'b', 'm', 'w', 'v', 'z']]
+
+# Function that compiles a keyboard layout into a substitution table: table[ord(char1)][ord(char2)] is the Manhattan distance
+# between the two keys, for every pair of byte values. A key that appears more than once is placed in the last row holding it,
+# at its first column in that row (as the original per-letter search placed it), and keys that aren't on the keyboard are at row -1, column -1
+def build_keyboard_table(layout):
+	positions = {}
+	for i in range(len(layout)):
+		for j in reversed(range(len(layout[i]))):
+			positions[layout[i][j]] = (i, j)
+	rows = []
+	cols = []
+	for code in range(256):
+		row, col = positions.get(chr(code), (-1, -1))
+		rows.append(row)
+		cols.append(col)
+	table = []
+	for code1 in range(256):
+		row1 = rows[code1]
+		col1 = cols[code1]
+		table.append([abs(row1 - rows[code2]) + abs(col1 - cols[code2]) for code2 in range(256)])
+	return table
+
+# Function that reads a keyboard layout from a file with one keyboard row per line. Keys on a line can be separated by spaces;
+# a line without spaces is read as one key per character
+def read_keyboard_layout(layoutFileName):
+	layout = []
+	for line in open(layoutFileName, 'rU'):
+		line = line.rstrip('\n').lower()
+		if line.strip() == "":
+			continue
+		if " " in line.strip():
+			layout.append(line.split())
+		else:
+			layout.append(list(line))
+	return layout
+
+# Substitution tables are built once per layout. The QWERTY table is built when the module loads;
+# the others (and any layout file) are built the first time they're asked for
+KEYBOARD_LAYOUTS = {"qwerty": QWERTY_LAYOUT, "azerty": AZERTY_LAYOUT, "dvorak": DVORAK_LAYOUT}
+KEYBOARD_TABLES = {"qwerty": build_keyboard_table(QWERTY_LAYOUT)}
+
+# Function that returns the substitution table for a layout name ("qwerty", "azerty" or "dvorak") or a layout file name
+def get_keyboard_table(layout):
+	if layout not in KEYBOARD_TABLES:
+		if layout in KEYBOARD_LAYOUTS:
+			KEYBOARD_TABLES[layout] = build_keyboard_table(KEYBOARD_LAYOUTS[layout])
+		else:
+			KEYBOARD_TABLES[layout] = build_keyboard_table(read_keyboard_layout(layout))
+	return KEYBOARD_TABLES[layout]
+
+# Function to compute the Levenshtein distance between two strings using the Manhattan distance (distance in rows + distance in columns) between two keys as the substitution cost
+# The Manhattan distances come from the layout's precomputed substitution table, so this is the same weighted dynamic program as levenshtein_distance
+def qwerty_levenshtein_distance(string1, string2, deletion_cost, insertion_cost, layout="qwerty"):
+	return wagner_fischer_distance(string1, string2, deletion_cost, insertion_cost, None, get_keyboard_table(layout))
 
 # Function that finds the closest word in a dictionary to a given input string. Calls the function to calculate Levenshtein distance
 # Modified slightly from find_closest_word function above to include inputs for insertion, deletion, and substitution costs
-def experiment_find_closest_word(string1, dictionary, insertion_cost, deletion_cost, substitution_cost):
+# An index is asked first if given; a BK-tree can only answer when all three costs are equal, otherwise the full scan below is used
+# A CorrectionCache can also be given, as in find_closest_word
+def experiment_find_closest_word(string1, dictionary, insertion_cost, deletion_cost, substitution_cost, index=None, cache=None):
+	if cache != None:
+		closest_word = cache.lookup(string1, (insertion_cost, deletion_cost, substitution_cost))
+		if closest_word == None:
+			closest_word = experiment_find_closest_word(string1, dictionary, insertion_cost, deletion_cost, substitution_cost, index)
+			cache.store(string1, (insertion_cost, deletion_cost, substitution_cost), closest_word)
+		return closest_word
+	if index != None:
+		closest_word = index.closest_word(string1, dictionary, insertion_cost, deletion_cost, substitution_cost)
+		if closest_word != None:
+			return closest_word
 	# Initialize cost variables
 	closest_word = ""
 	# Initialize min distance
 	min_distance = levenshtein_distance(string1, dictionary[0][0], deletion_cost, insertion_cost, substitution_cost)
 	# Go through each word in dicationary and calculate the distance, checking to see if it's smaller than the current smallest distance
+	# Only distances below min_distance matter, so the bounded distance can give up early on words that are further away
 	for dict_word in dictionary:
-		curr_distance = levenshtein_distance(string1, dict_word[0], deletion_cost, insertion_cost, substitution_cost)
+		curr_distance = bounded_levenshtein_distance(string1, dict_word[0], deletion_cost, insertion_cost, substitution_cost, min_distance)
 		if curr_distance == 0: # we found a perfect match
 			return dict_word[0]
 		elif curr_distance < min_distance:
@@ -229,15 +717,21 @@ def experiment_find_closest_word(string1, dictionary, insertion_cost, deletion_c
 
 # Function that finds the closest word in a dictionary to a given input string. Calls the function to calculate Levenshtein distance
 # Modified slightly from find_closest_word function above to include inputs for insertion and deletion costs.
-# The substitution cost in this function is the manhattan distance.
-def experiment_find_closest_word_querty(string1, dictionary, insertion_cost, deletion_cost):
+# The substitution cost in this function is the manhattan distance on the given keyboard layout (QWERTY unless another is chosen).
+def experiment_find_closest_word_querty(string1, dictionary, insertion_cost, deletion_cost, layout="qwerty", index=None):
+	substitution_table = get_keyboard_table(layout)
+	if index != None:
+		closest_word = index.closest_word(string1, dictionary, insertion_cost, deletion_cost, None, substitution_table)
+		if closest_word != None:
+			return closest_word
 	# Initialize cost variables
 	closest_word = ""
 	# Initialize min distance
-	min_distance = qwerty_levenshtein_distance(string1, dictionary[0][0], deletion_cost, insertion_cost)
+	min_distance = wagner_fischer_distance(string1, dictionary[0][0], deletion_cost, insertion_cost, None, substitution_table)
 	# Go through each word in dicationary and calculate the distance, checking to see if it's smaller than the current smallest distance
+	# Only distances below min_distance matter, so the bounded distance can give up early on words that are further away
 	for dict_word in dictionary:
-		curr_distance = qwerty_levenshtein_distance(string1, dict_word[0], deletion_cost, insertion_cost)
+		curr_distance = bounded_levenshtein_distance(string1, dict_word[0], deletion_cost, insertion_cost, None, min_distance, substitution_table)
 		if curr_distance == 0: # we found a perfect match
 			return dict_word[0]
 		elif curr_distance < min_distance:
@@ -249,63 +743,125 @@ def experiment_find_closest_word_querty(string1, dictionary, insertion_cost, del
 # whether the corrected typo (calculated using the spell_check function) matches the corresponding true word.
 # The function also tracks the time it takes to measure the error for all of the data.
 # This is modified from the measure_error function above to go through a set of possible paramters, testing to find which has the lowest error rate.
-def measure_error_experiment(typos, truewords, dictionarywords):
-	results = []
+# All of the parameter settings are evaluated together by the sweep engine below, optionally split across worker processes.
+def measure_error_experiment(typos, truewords, dictionarywords, workers=1):
+	if len(typos) == 0: # Check to make sure that we actually have data
+		return 0
 	values = [0,1,2,4]
+	configurations = []
 	for insertion in values:
 		for deletion in values:
 			for substitution in values:
-				print "checking permutation: insertion = %d, deletion = %d, substitution = %d" % (insertion, deletion, substitution)
-				curr_result = [[insertion, deletion, substitution]]
-				start = time.time()
-				if len(typos) == 0: # Check to make sure that we actually have data
-					return 0
-				error_count = 0
-				# Go through list of typos and find the closest word in the dictionary, then compare to the trueword at that index
-				for i in range(len(typos)):
-					corrected_word = experiment_find_closest_word(typos[i], dictionarywords, insertion, deletion, substitution)
-					# Increment error count if the corrected word is different than the true word
-					if corrected_word != truewords[i]:
-						error_count += 1
-				# Compute the error rate
-				error_rate = float(error_count) / float(len(typos))
-				curr_result.append(error_rate)
-				print "time elapsed = %.1f seconds" % (time.time() - start)
-				print "error rate is: %f" % error_rate
-				results.append(curr_result)
+				configurations.append((insertion, deletion, substitution))
+	start = time.time()
+	error_rates = sweep_error_rates(typos, truewords, dictionarywords, configurations, None, workers)
+	print "time elapsed = %.1f seconds" % (time.time() - start)
+	results = []
+	for c in range(len(configurations)):
+		insertion, deletion, substitution = configurations[c]
+		print "permutation: insertion = %d, deletion = %d, substitution = %d, error rate is: %f" % (insertion, deletion, substitution, error_rates[c])
+		results.append([[insertion, deletion, substitution], error_rates[c]])
 	return results
 
 # Function that calculates the error rate for a set of typos, truewords, and dictionary words by comparing
 # whether the corrected typo (calculated using the spell_check function) matches the corresponding true word.
 # The function also tracks the time it takes to measure the error for all of the data.
 # This is modified from the measure_error function above to go through a set of possible paramters, testing to find which has the lowest error rate.
-# The substitution cost in this function is the manhattan distance
-def measure_error_experiment_querty(typos, truewords, dictionarywords):
-	results = []
+# The substitution cost in this function is the manhattan distance on the given keyboard layout
+def measure_error_experiment_querty(typos, truewords, dictionarywords, layout="qwerty", workers=1):
+	if len(typos) == 0: # Check to make sure that we actually have data
+		return 0
 	values = [1,2,4]
+	configurations = []
 	for insertion in values:
 		for deletion in values:
-			print "checking permutation: insertion = %d, deletion = %d" % (insertion, deletion)
-			curr_result = [[insertion, deletion]]
-			start = time.time()
-			if len(typos) == 0: # Check to make sure that we actually have data
-				return 0
-			error_count = 0
-			# Go through list of typos and find the closest word in the dictionary, then compare to the trueword at that index
-			for i in range(len(typos)):
-				corrected_word = experiment_find_closest_word_querty(typos[i], dictionarywords, insertion, deletion)
-				# Increment error count if the corrected word is different than the true word
-				if corrected_word != truewords[i]:
-					error_count += 1
-			# Compute the error rate
-			error_rate = float(error_count) / float(len(typos))
-			curr_result.append(error_rate)
-			print "time elapsed = %.1f seconds" % (time.time() - start)
-			print "error rate is: %f" % error_rate
-			results.append(curr_result)
+			configurations.append((insertion, deletion, None))
+	start = time.time()
+	error_rates = sweep_error_rates(typos, truewords, dictionarywords, configurations, get_keyboard_table(layout), workers)
+	print "time elapsed = %.1f seconds" % (time.time() - start)
+	results = []
+	for c in range(len(configurations)):
+		insertion, deletion, substitution = configurations[c]
+		print "permutation: insertion = %d, deletion = %d, error rate is: %f" % (insertion, deletion, error_rates[c])
+		results.append([[insertion, deletion], error_rates[c]])
 	return results
 
+# Function that finds the closest word to string1 under many cost configurations at once, returning for each configuration the word
+# experiment_find_closest_word (or experiment_find_closest_word_querty, when a substitution_table is given) would return.
+# configurations is a list of (insertion, deletion, substitution) cost tuples; the substitution cost is ignored when there is a substitution_table.
+# Each bucket of dictionary words goes through the NumPy dynamic program once for all of the configurations together, and a bucket is skipped
+# for any configuration where its length difference alone already costs more than the best distance found so far
+def sweep_closest_words(string1, dictionary, vector_dictionary, configurations, substitution_table=None):
+	insertion_costs = np.array([configuration[0] for configuration in configurations], dtype=float)
+	deletion_costs = np.array([configuration[1] for configuration in configurations], dtype=float)
+	if substitution_table is not None:
+		substitution_costs = np.zeros(len(configurations))
+	else:
+		substitution_costs = np.array([configuration[2] for configuration in configurations], dtype=float)
+	first_distances = np.array([wagner_fischer_distance(string1, dictionary[0][0], configuration[1], configuration[0], configuration[2], substitution_table) for configuration in configurations], dtype=float)
+	min_distances = first_distances.copy()
+	min_indices = np.zeros(len(configurations), dtype=int)
+	if substitution_table is not None:
+		substitution_table = np.asarray(substitution_table) # convert the table once rather than once per bucket
+	length1 = len(string1)
+	# Go through the buckets closest in length first, so the best distances drop quickly
+	for length in sorted(vector_dictionary.lengths, key=lambda length: abs(length - length1)):
+		if length1 >= length:
+			length_costs = (length1 - length) * deletion_costs
+		else:
+			length_costs = (length - length1) * insertion_costs
+		active = np.nonzero(length_costs <= min_distances)[0]
+		if len(active) == 0:
+			continue
+		distances = vector_dictionary.bucket_distances(string1, length, deletion_costs[active].reshape(-1, 1, 1), insertion_costs[active].reshape(-1, 1, 1), substitution_costs[active].reshape(-1, 1, 1), substitution_table)
+		best = np.argmin(distances, axis=1) # first word at the smallest distance, since buckets are in dictionary order
+		best_distances = distances[np.arange(len(active)), best]
+		best_indices = vector_dictionary.indices[length][best]
+		# Ties are broken by dictionary order, the same way the linear scan breaks them
+		better = (best_distances < min_distances[active]) | ((best_distances == min_distances[active]) & (best_indices < min_indices[active]))
+		min_distances[active[better]] = best_distances[better]
+		min_indices[active[better]] = best_indices[better]
+	closest_words = []
+	for c in range(len(configurations)):
+		closest_words.append(select_closest_word(dictionary, min_distances[c], min_indices[c], first_distances[c]))
+	return closest_words
+
+# Function that counts, for each cost configuration, how many typos are corrected to something other than their true word
+def sweep_error_counts(typos, truewords, dictionarywords, configurations, substitution_table=None):
+	vector_dictionary = VectorDictionary(dictionarywords)
+	error_counts = [0] * len(configurations)
+	for i in range(len(typos)):
+		closest_words = sweep_closest_words(typos[i], dictionarywords, vector_dictionary, configurations, substitution_table)
+		for c in range(len(configurations)):
+			if closest_words[c] != truewords[i]:
+				error_counts[c] += 1
+	return error_counts
+
+# Function that returns the error rate for each cost configuration. With more than one worker the configurations are dealt out
+# to a pool of processes, each of which sweeps all of the typos for its share of the configurations
+def sweep_error_rates(typos, truewords, dictionarywords, configurations, substitution_table=None, workers=1):
+	if workers > 1:
+		pool = multiprocessing.Pool(workers)
+		shares = [range(w, len(configurations), workers) for w in range(workers)]
+		pending = []
+		for share in shares:
+			share_configurations = [configurations[c] for c in share]
+			pending.append(pool.apply_async(sweep_error_counts, (typos, truewords, dictionarywords, share_configurations, substitution_table)))
+		error_counts = [0] * len(configurations)
+		for w in range(workers):
+			share_counts = pending[w].get()
+			for k in range(len(shares[w])):
+				error_counts[shares[w][k]] = share_counts[k]
+		pool.close()
+		pool.join()
+	else:
+		error_counts = sweep_error_counts(typos, truewords, dictionarywords, configurations, substitution_table)
+	error_rates = []
+	for error_count in error_counts:
+		error_rates.append(float(error_count) / float(len(typos)))
+	return error_rates
+
 ############ End functions not used in spellcheck.py (other parts of assignment) ############
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+	main()
\ No newline at end of file
@@ -0,0 +1,495 @@
+import math
+import collections
+import numpy as np
+
+
+############ Distance functions and the search indexes spellcheck.py builds over a dictionary ############
+# The indexes are pickled (see spellcheck.save_index and spellcheck.compile_dictionary), and a pickle records the module a class
+# is defined in, so they live in this module rather than in spellcheck.py: they are then always pickled as spellindex.<name>,
+# whether spellcheck.py is run as a script or imported by another program, and any of them can load the files
+
+# Function to compute the Levenshtein distance between two strings, built from pseudo code for Wagner and Fischer algorithm
+# When all costs are 1 the bit-parallel kernel below gives the same distance much faster, so it is used instead
+def levenshtein_distance(string1, string2, deletion_cost, insertion_cost, substitution_cost):
+	if deletion_cost == 1 and insertion_cost == 1 and substitution_cost == 1:
+		return bit_parallel_levenshtein_distance(build_char_masks(string1), len(string1), string2)
+	return wagner_fischer_distance(string1, string2, deletion_cost, insertion_cost, substitution_cost)
+
+# Function to compute the weighted Levenshtein distance with the Wagner and Fischer dynamic program
+# Only the previous column of the distance matrix is needed to fill in the current one, so two Python lists are kept instead of the whole matrix
+# If a substitution_table is given (see build_keyboard_table), substitution costs are looked up in it instead of using substitution_cost
+def wagner_fischer_distance(string1, string2, deletion_cost, insertion_cost, substitution_cost, substitution_table=None):
+	# capitalization doesn't matter, so lowercase both strings once instead of once per cell
+	string1 = string1.lower()
+	string2 = string2.lower()
+	codes1 = [ord(char) for char in string1]
+	m = len(string1) + 1
+	prev_column = [i * deletion_cost for i in range(m)] # distance of any 1st string to an empty 2nd string
+	for j in range(1, len(string2) + 1):
+		char2 = string2[j-1]
+		if substitution_table != None:
+			substitution_costs = substitution_table[ord(char2)]
+		curr_column = [j * insertion_cost] * m # distance of an empty 1st string to any 2nd string
+		for i in range(1, m):
+			if string1[i-1] == char2:
+				curr_column[i] = prev_column[i-1] # no operation cost, because they match
+			else:
+				if substitution_table != None:
+					substitution_cost = substitution_costs[codes1[i-1]]
+				curr_column[i] = min(curr_column[i-1] + deletion_cost, prev_column[i] + insertion_cost, prev_column[i-1] + substitution_cost)
+		prev_column = curr_column
+	return prev_column[m-1]
+
+# Function that returns the cheapest possible cost of making two strings of lengths m and n the same length:
+# every path through the distance matrix uses at least m - n deletions (or n - m insertions), whatever else it does
+def length_difference_cost(m, n, deletion_cost, insertion_cost):
+	if m >= n:
+		return (m - n) * deletion_cost
+	return (n - m) * insertion_cost
+
+# Function to compute the weighted Levenshtein distance, giving up as soon as it is known to be more than cutoff.
+# Returns the exact distance if it is at most cutoff, and otherwise some value greater than cutoff, so a search loop can pass in
+# the best distance found so far and treat anything above it as "not closer". Uses the same recurrence as wagner_fischer_distance, but
+#  - skips the dynamic program when the length difference alone already costs more than cutoff,
+#  - only fills in the band of diagonals a path costing at most cutoff can pass through, and
+#  - stops once every cell of a column is over cutoff, since every path has to cross every column
+# As in wagner_fischer_distance, substitution costs can come from a substitution_table instead
+def bounded_levenshtein_distance(string1, string2, deletion_cost, insertion_cost, substitution_cost, cutoff, substitution_table=None):
+	m = len(string1)
+	n = len(string2)
+	length_cost = length_difference_cost(m, n, deletion_cost, insertion_cost)
+	if length_cost > cutoff:
+		return length_cost
+	# A path through cell (i, j) costs at least the length difference cost of getting there plus that of getting from there to the end,
+	# which only depends on the diagonal i - j. Find the range of diagonals [band_low, band_high] where that is at most cutoff
+	band_low = min(0, m - n)
+	while band_low > -n and length_difference_cost(0, 1 - band_low, deletion_cost, insertion_cost) + length_difference_cost(m - band_low + 1, n, deletion_cost, insertion_cost) <= cutoff:
+		band_low -= 1
+	band_high = max(0, m - n)
+	while band_high < m and length_difference_cost(band_high + 1, 0, deletion_cost, insertion_cost) + length_difference_cost(m - band_high - 1, n, deletion_cost, insertion_cost) <= cutoff:
+		band_high += 1
+	# capitalization doesn't matter, so lowercase both strings once instead of once per cell
+	string1 = string1.lower()
+	string2 = string2.lower()
+	codes1 = [ord(char) for char in string1]
+	infinity = float('inf') # cells outside the band can't be on a path costing at most cutoff
+	prev_column = [infinity] * (m + 1)
+	for i in range(min(m, band_high) + 1):
+		prev_column[i] = i * deletion_cost
+	for j in range(1, n + 1):
+		char2 = string2[j-1]
+		if substitution_table != None:
+			substitution_costs = substitution_table[ord(char2)]
+		curr_column = [infinity] * (m + 1)
+		if j <= -band_low:
+			curr_column[0] = j * insertion_cost
+		column_min = curr_column[0]
+		for i in range(max(1, j + band_low), min(m, j + band_high) + 1):
+			if string1[i-1] == char2:
+				curr_column[i] = prev_column[i-1] # no operation cost, because they match
+			else:
+				if substitution_table != None:
+					substitution_cost = substitution_costs[codes1[i-1]]
+				curr_column[i] = min(curr_column[i-1] + deletion_cost, prev_column[i] + insertion_cost, prev_column[i-1] + substitution_cost)
+			if curr_column[i] < column_min:
+				column_min = curr_column[i]
+		if column_min > cutoff:
+			return column_min
+		prev_column = curr_column
+	return prev_column[m]
+
+# Function that builds the character masks used by bit_parallel_levenshtein_distance. Bit i of a character's mask is set when
+# string1[i] is that character (capitalization doesn't matter). Built once per query word and reused for every dictionary word
+def build_char_masks(string1):
+	char_masks = {}
+	bit = 1
+	for char in string1.lower():
+		char_masks[char] = char_masks.get(char, 0) | bit
+		bit <<= 1
+	return char_masks
+
+# Function to compute the unit-cost Levenshtein distance with Myers' bit-parallel algorithm (as formulated by Hyyro).
+# A column of the distance matrix is stored as two bit vectors marking where the distance goes up (+1) or down (-1) from the cell above,
+# so each character of string2 updates the whole column with a handful of integer operations instead of one Python step per cell.
+# Python integers have no fixed width, so string1 can be any length
+def bit_parallel_levenshtein_distance(char_masks, length1, string2):
+	if length1 == 0:
+		return len(string2)
+	all_bits = (1 << length1) - 1
+	last_bit = 1 << (length1 - 1)
+	vertical_up = all_bits # the first column is 0, 1, 2, ... so every step down goes up by one
+	vertical_down = 0
+	distance = length1 # distance in the last row of the current column
+	for char in string2.lower():
+		match = char_masks.get(char, 0)
+		x_vertical = match | vertical_down
+		x_horizontal = (((match & vertical_up) + vertical_up) ^ vertical_up) | match
+		horizontal_up = vertical_down | ~(x_horizontal | vertical_up)
+		horizontal_down = vertical_up & x_horizontal
+		# keep track of the last row of the column
+		if horizontal_up & last_bit:
+			distance += 1
+		elif horizontal_down & last_bit:
+			distance -= 1
+		# the first row is 0, 1, 2, ... so a +1 horizontal difference is shifted in at the top
+		horizontal_up = ((horizontal_up << 1) | 1) & all_bits
+		horizontal_down = (horizontal_down << 1) & all_bits
+		vertical_up = (horizontal_down | ~(x_vertical | horizontal_up)) & all_bits
+		vertical_down = horizontal_up & x_vertical
+	return distance
+
+# Function that picks the word the linear scan in spellcheck.find_closest_word would return, given the smallest distance found,
+# the dictionary index of the first word at that distance, and the distance to the first dictionary word.
+# The scan starts with min_distance set to the first word's distance and only replaces closest_word on a strictly smaller distance,
+# so it returns "" unless there is a perfect match or a word strictly closer than the first dictionary word
+def select_closest_word(dictionary, min_distance, min_index, first_distance):
+	if min_distance == 0 or min_distance < first_distance:
+		return dictionary[min_index][0]
+	return ""
+
+#### Classes used to represent a BK-tree built over the dictionary
+# Each node holds one lowercased dictionary word, the dictionary indices of every entry that lowercases to it (e.g. "A" and "a"),
+# and its children keyed by their distance to this node's word
+class BKTreeNode:
+	def __init__(self, word, index):
+		self.word = word
+		self.indices = [index]
+		self.children = {}
+
+# Unit-cost Levenshtein distance is a metric, so by the triangle inequality a subtree hanging off an edge of length e can only
+# contain words within min_distance of the query if |d - e| <= min_distance, where d is the query's distance to the node
+# Before searching the tree, closest_word looks the query and every string one edit away from it up in a table of the nodes.
+# Most typos are one edit from some word, and then that lookup already finds the answer; otherwise the tree search starts
+# knowing the answer is at least two edits away
+class BKTree:
+	def __init__(self):
+		self.root = None
+		self.nodes = {} # lowercased word -> its node
+		self.alphabet = set() # every character in a lowercased dictionary word
+
+	# Add a lowercased dictionary word (and its index in the dictionary) to the tree
+	def add(self, word, index):
+		self.alphabet.update(word)
+		if self.root == None:
+			self.root = BKTreeNode(word, index)
+			self.nodes[word] = self.root
+			return
+		node = self.root
+		while True:
+			distance = levenshtein_distance(word, node.word, 1, 1, 1)
+			if distance == 0: # same word up to capitalization, so keep it in the same node
+				node.indices.append(index)
+				return
+			if distance not in node.children:
+				node.children[distance] = BKTreeNode(word, index)
+				self.nodes[word] = node.children[distance]
+				return
+			node = node.children[distance]
+
+	# Function that returns the same word as the linear scan in spellcheck.find_closest_word, or None if the tree can't answer for these costs
+	def closest_word(self, string1, dictionary, insertion_cost=1, deletion_cost=1, substitution_cost=1, substitution_table=None):
+		# The tree stores unit-cost distances, which rank words the same way as any setting where all three costs are equal and positive
+		if insertion_cost != deletion_cost or deletion_cost != substitution_cost or substitution_cost <= 0 or substitution_table != None or self.root == None:
+			return None
+		char_masks = build_char_masks(string1)
+		length1 = len(string1)
+		first_distance = bit_parallel_levenshtein_distance(char_masks, length1, dictionary[0][0])
+		# A word at distance 0 or 1 must be the query itself or one of its single-edit variants, all of which are looked up directly
+		string1 = string1.lower()
+		if string1 in self.nodes:
+			return dictionary[self.nodes[string1].indices[0]][0]
+		nearby_index = None
+		for variant in single_edit_variants(string1, self.alphabet):
+			if variant in self.nodes and (nearby_index == None or self.nodes[variant].indices[0] < nearby_index):
+				nearby_index = self.nodes[variant].indices[0]
+		if nearby_index != None:
+			return select_closest_word(dictionary, 1, nearby_index, first_distance)
+		min_distance = first_distance
+		min_index = 0
+		# Each entry is a subtree still to be searched and a lower bound on the distance to any word in it
+		stack = [(self.root, 0)]
+		while len(stack) > 0:
+			node, lower_bound = stack.pop()
+			# The best distance may have dropped since the subtree was pushed
+			if lower_bound > min_distance:
+				continue
+			curr_distance = bit_parallel_levenshtein_distance(char_masks, length1, node.word)
+			if curr_distance == 0: # we found a perfect match, and every entry matching it lives in this node
+				return dictionary[node.indices[0]][0]
+			# Ties are broken by dictionary order, the same way the linear scan breaks them
+			if curr_distance < min_distance or (curr_distance == min_distance and node.indices[0] < min_index):
+				min_distance = curr_distance
+				min_index = node.indices[0]
+			# Visit every child that could hold a word at least as close as the best so far (ties included),
+			# pushing the ones with the smallest lower bound last so they are searched first and the best distance drops quickly
+			children = []
+			for edge, child in node.children.iteritems():
+				if abs(curr_distance - edge) <= min_distance:
+					children.append((abs(curr_distance - edge), child))
+			children.sort(key=lambda entry: -entry[0])
+			for child_bound, child in children:
+				stack.append((child, child_bound))
+		return select_closest_word(dictionary, min_distance, min_index, first_distance)
+
+# Function that returns every string one deletion, insertion or substitution (of a character from alphabet) away from a word
+def single_edit_variants(word, alphabet):
+	variants = set()
+	for i in range(len(word) + 1):
+		if i < len(word):
+			variants.add(word[:i] + word[i+1:])
+		for char in alphabet:
+			variants.add(word[:i] + char + word[i:])
+			if i < len(word):
+				variants.add(word[:i] + char + word[i+1:])
+	variants.discard(word)
+	return variants
+
+# Function that builds a BK-tree from the output of spellcheck.read_dictionary
+def build_bk_tree(dictionary):
+	tree = BKTree()
+	for i in range(len(dictionary)):
+		tree.add(dictionary[i][0].lower(), i)
+	return tree
+
+#### Class used to compute the distance from one word to every dictionary word at once with NumPy
+# The lowercased dictionary is encoded once into integer arrays grouped by word length, so the k words of length L form a (k, L) array.
+# The dynamic program then fills in one row (one character of the query) at a time for all of the words in a bucket together
+class VectorDictionary:
+	def __init__(self, dictionary):
+		# A compiled dictionary (see spellcheck.CompiledDictionary) already holds the encoded buckets, so its memory-mapped arrays are used directly
+		if hasattr(dictionary, "bucket_codes"):
+			self.lengths = dictionary.lengths
+			self.indices = dictionary.bucket_indices
+			self.codes = dictionary.bucket_codes
+			self.size = len(dictionary)
+			return
+		buckets = {}
+		for i in range(len(dictionary)):
+			buckets.setdefault(len(dictionary[i][0]), []).append(i)
+		self.lengths = sorted(buckets.keys())
+		self.indices = {} # dictionary index of each row of a bucket, in dictionary order
+		self.codes = {} # character codes of the lowercased words in a bucket
+		for length in self.lengths:
+			indices = buckets[length]
+			codes = [[ord(char) for char in dictionary[i][0].lower()] for i in indices]
+			self.indices[length] = np.array(indices)
+			self.codes[length] = np.array(codes, dtype=np.int32).reshape(len(indices), length)
+		self.size = len(dictionary)
+
+	# Function that computes the distance from string1 to every word of the given length, in the same order as self.indices[length]
+	# If a substitution_table is given (see build_keyboard_table), substitution costs are looked up in it instead of using substitution_cost.
+	# The costs can also be arrays of shape (configurations, 1, 1), in which case the result has one row of distances per cost configuration
+	def bucket_distances(self, string1, length, deletion_cost, insertion_cost, substitution_cost, substitution_table=None):
+		string1 = string1.lower()
+		codes = self.codes[length]
+		columns = np.arange(length + 1)
+		if substitution_table is not None:
+			substitution_table = np.asarray(substitution_table)
+			substitution_cost = substitution_table.max()
+		# First row: distance of an empty 1st string to every prefix of the dictionary words
+		row = np.zeros((len(codes), length + 1)) + columns * insertion_cost
+		# Larger than the spread of any row, used below to keep the segments of a row apart
+		offset = 2 * (len(string1) + length + 1) * (deletion_cost + insertion_cost + substitution_cost) + 1
+		segments = np.zeros((len(codes), length + 1))
+		for i in range(1, len(string1) + 1):
+			match = codes == ord(string1[i-1])
+			diagonal = row[..., :-1]
+			if substitution_table is not None:
+				substitution_cost = substitution_table[ord(string1[i-1])][codes]
+			# Cost of every cell without the insertion coming from its left neighbour in the same row
+			values = np.empty(row.shape)
+			values[..., :1] = i * deletion_cost
+			values[..., 1:] = np.where(match, diagonal, np.minimum(row[..., 1:] + deletion_cost, diagonal + substitution_cost))
+			# A matching cell only takes its diagonal, and every other cell is min(values[j], new[j-1] + insertion_cost).
+			# Within a segment that starts at column 0 or at a match, that is the running minimum of values[j] - j * insertion_cost
+			# (plus j * insertion_cost). Each segment is shifted down by the offset so the running minimum never reaches back into an earlier one
+			segments[:, 1:] = np.cumsum(match, axis=1)
+			shifted = values - columns * insertion_cost - segments * offset
+			row = np.minimum.accumulate(shifted, axis=-1) + segments * offset + columns * insertion_cost
+		return row[..., length]
+
+	# Function that computes the distance from string1 to every dictionary word, in dictionary order
+	def distances(self, string1, deletion_cost=1, insertion_cost=1, substitution_cost=1, substitution_table=None):
+		if substitution_table is not None:
+			substitution_table = np.asarray(substitution_table) # convert the table once rather than once per bucket
+		distances = np.empty(self.size)
+		for length in self.lengths:
+			distances[self.indices[length]] = self.bucket_distances(string1, length, deletion_cost, insertion_cost, substitution_cost, substitution_table)
+		return distances
+
+	# Function that returns the same word as the linear scan in spellcheck.find_closest_word (or the experiment functions for other costs)
+	def closest_word(self, string1, dictionary, insertion_cost=1, deletion_cost=1, substitution_cost=1, substitution_table=None):
+		if substitution_table is not None:
+			first_distance = wagner_fischer_distance(string1, dictionary[0][0], deletion_cost, insertion_cost, substitution_cost, substitution_table)
+			substitution_table = np.asarray(substitution_table) # convert the table once rather than once per bucket
+		else:
+			first_distance = levenshtein_distance(string1, dictionary[0][0], deletion_cost, insertion_cost, substitution_cost)
+		min_distance = first_distance
+		min_index = 0
+		# Go through the buckets closest in length first, so the best distance drops quickly and buckets too far off in length can be skipped
+		for length in sorted(self.lengths, key=lambda length: abs(length - len(string1))):
+			if length_difference_cost(len(string1), length, deletion_cost, insertion_cost) > min_distance:
+				continue
+			distances = self.bucket_distances(string1, length, deletion_cost, insertion_cost, substitution_cost, substitution_table)
+			best = np.argmin(distances) # first word at the smallest distance, since buckets are in dictionary order
+			# Ties are broken by dictionary order, the same way the linear scan breaks them
+			if distances[best] < min_distance or (distances[best] == min_distance and self.indices[length][best] < min_index):
+				min_distance = distances[best]
+				min_index = int(self.indices[length][best])
+		return select_closest_word(dictionary, min_distance, min_index, first_distance)
+
+#### Class used to look words up in a SymSpell-style deletion index
+# Every lowercased dictionary word is stored under each string that can be made from it with at most max_distance deletions.
+# If a query is within max_distance (unit-cost) edits of a dictionary word, some deletion variant of the query is also a deletion
+# variant of that word, so looking up the query's own deletion variants finds every dictionary word within max_distance
+class SymSpellIndex:
+	def __init__(self, dictionary, max_distance=2):
+		self.max_distance = max_distance
+		self.words = [] # distinct lowercased dictionary words
+		self.first_indices = [] # dictionary index of the first entry that lowercases to each word
+		self.deletes = {} # deletion variant -> positions in self.words of the words it can be made from
+		seen = {}
+		for i in range(len(dictionary)):
+			word = dictionary[i][0].lower()
+			if word in seen:
+				continue
+			seen[word] = len(self.words)
+			for variant in deletion_variants(word, max_distance):
+				self.deletes.setdefault(variant, []).append(len(self.words))
+			self.words.append(word)
+			self.first_indices.append(i)
+
+	# Function that returns the same word as the linear scan in spellcheck.find_closest_word, or None when no dictionary word
+	# is within max_distance of string1 (or the costs aren't all equal), so the caller falls back to the full scan
+	def closest_word(self, string1, dictionary, insertion_cost=1, deletion_cost=1, substitution_cost=1, substitution_table=None):
+		# Distances are unit-cost, which rank words the same way as any setting where all three costs are equal and positive
+		if insertion_cost != deletion_cost or deletion_cost != substitution_cost or substitution_cost <= 0 or substitution_table != None:
+			return None
+		char_masks = build_char_masks(string1)
+		length1 = len(string1)
+		min_distance = self.max_distance + 1
+		min_index = None
+		candidates = set()
+		for variant in deletion_variants(string1.lower(), self.max_distance):
+			candidates.update(self.deletes.get(variant, []))
+		for candidate in candidates:
+			curr_distance = bit_parallel_levenshtein_distance(char_masks, length1, self.words[candidate])
+			# Ties are broken by dictionary order, the same way the linear scan breaks them
+			if curr_distance < min_distance or (curr_distance == min_distance and self.first_indices[candidate] < min_index):
+				min_distance = curr_distance
+				min_index = self.first_indices[candidate]
+		if min_index == None:
+			return None
+		# Every dictionary word at least as close as the best candidate is itself a candidate, so this is the scan's answer
+		first_distance = bit_parallel_levenshtein_distance(char_masks, length1, dictionary[0][0])
+		return select_closest_word(dictionary, min_distance, min_index, first_distance)
+
+# Function that returns the set of strings that can be made from word with at most max_distance deletions (including word itself)
+def deletion_variants(word, max_distance):
+	variants = set([word])
+	frontier = [word]
+	for distance in range(max_distance):
+		next_frontier = []
+		for variant in frontier:
+			for i in range(len(variant)):
+				shorter = variant[:i] + variant[i+1:]
+				if shorter not in variants:
+					variants.add(shorter)
+					next_frontier.append(shorter)
+		frontier = next_frontier
+	return variants
+
+#### Class used to narrow the linear scan down to a few candidates with a q-gram inverted index, for any costs (including keyboard costs)
+# Every lowercased dictionary word is padded with q - 1 markers on each side and split into its len(word) + q - 1 overlapping q-grams.
+# Two strings that are k unit-cost edits apart still share at least max(m, n) + q - 1 - k * q of those q-grams (count filter).
+# With weighted costs every edit costs at least the cheapest insertion, deletion or substitution, so a word that is at most B away
+# is at most floor(B / cheapest) edits away, and it is also at least length_difference_cost away (length filter). With B the best
+# distance found so far, every word that could still be the answer passes both filters, so the exact weighted dynamic program
+# only has to run on the words that do
+class QGramIndex:
+	def __init__(self, dictionary, q=2):
+		self.q = q
+		self.words = [] # distinct lowercased dictionary words
+		self.first_indices = [] # dictionary index of the first entry that lowercases to each word
+		postings = {} # q-gram -> (positions in self.words of the words containing it, how many times each contains it)
+		seen = set()
+		alphabet = set()
+		for i in range(len(dictionary)):
+			word = dictionary[i][0].lower()
+			if word in seen:
+				continue
+			seen.add(word)
+			alphabet.update(word)
+			for gram, count in self.qgram_counts(word).iteritems():
+				positions, counts = postings.setdefault(gram, ([], []))
+				positions.append(len(self.words))
+				counts.append(count)
+			self.words.append(word)
+			self.first_indices.append(i)
+		self.postings = {}
+		for gram, (positions, counts) in postings.iteritems():
+			self.postings[gram] = (np.array(positions, dtype=np.int32), np.array(counts, dtype=np.int32))
+		self.lengths = np.array([len(word) for word in self.words])
+		self.alphabet = sorted([ord(char) for char in alphabet]) # character codes used by the dictionary words
+
+	# Function that counts the padded q-grams of a lowercased word
+	def qgram_counts(self, word):
+		padding = "\x00" * (self.q - 1)
+		padded = padding + word + padding
+		return collections.Counter([padded[i:i + self.q] for i in range(len(word) + self.q - 1)])
+
+	# Function that returns how many q-grams (counted with repeats) string1 shares with each of self.words
+	def shared_qgrams(self, string1):
+		shared = np.zeros(len(self.words), dtype=np.int32)
+		for gram, count in self.qgram_counts(string1.lower()).iteritems():
+			if gram in self.postings:
+				positions, counts = self.postings[gram]
+				shared[positions] += np.minimum(counts, count)
+		return shared
+
+	# Function that returns the cheapest single edit on string1: an insertion, a deletion, or substituting one of its characters
+	# with another character used in the dictionary
+	def cheapest_edit(self, string1, insertion_cost, deletion_cost, substitution_cost, substitution_table):
+		cheapest = min(insertion_cost, deletion_cost)
+		if substitution_table == None:
+			return min(cheapest, substitution_cost)
+		for code1 in set([ord(char) for char in string1.lower()]):
+			for code2 in self.alphabet:
+				if code2 != code1 and substitution_table[code2][code1] < cheapest:
+					cheapest = substitution_table[code2][code1]
+		return cheapest
+
+	# Function that returns the same word as the linear scan in spellcheck.find_closest_word (or the experiment functions for other costs),
+	# or None if some edit is free, since then no number of edits can be ruled out and the caller falls back to the full scan
+	def closest_word(self, string1, dictionary, insertion_cost=1, deletion_cost=1, substitution_cost=1, substitution_table=None):
+		cheapest = self.cheapest_edit(string1, insertion_cost, deletion_cost, substitution_cost, substitution_table)
+		if cheapest <= 0 or len(self.words) == 0:
+			return None
+		first_distance = wagner_fischer_distance(string1, dictionary[0][0], deletion_cost, insertion_cost, substitution_cost, substitution_table)
+		min_distance = first_distance
+		min_index = 0
+		# Count and length filters for words that are no further away than the first dictionary word
+		length1 = len(string1)
+		shared = self.shared_qgrams(string1)
+		length_costs = np.where(self.lengths >= length1, (self.lengths - length1) * insertion_cost, (length1 - self.lengths) * deletion_cost)
+		max_edits = int(math.floor(min_distance / float(cheapest) + 1e-9))
+		passes = (shared >= np.maximum(self.lengths, length1) + self.q - 1 - max_edits * self.q) & (length_costs <= min_distance)
+		candidates = np.flatnonzero(passes)
+		# Words sharing the most q-grams are usually the closest, so trying them first brings the best distance (and with it the number
+		# of edits the filters allow) down quickly. Every candidate is checked against the filters again with the current best distance
+		candidates = candidates[np.argsort(-shared[candidates], kind='mergesort')].tolist()
+		shared = shared.tolist()
+		length_costs = length_costs.tolist()
+		for candidate in candidates:
+			# No word shares fewer than length1 + q - 1 - max_edits * q q-grams with string1 and passes, and the rest share even fewer
+			if shared[candidate] < length1 + self.q - 1 - max_edits * self.q:
+				break
+			if shared[candidate] < max(self.lengths[candidate], length1) + self.q - 1 - max_edits * self.q or length_costs[candidate] > min_distance:
+				continue
+			curr_distance = bounded_levenshtein_distance(string1, self.words[candidate], deletion_cost, insertion_cost, substitution_cost, min_distance, substitution_table)
+			# Ties are broken by dictionary order, the same way the linear scan breaks them
+			if curr_distance < min_distance or (curr_distance == min_distance and self.first_indices[candidate] < min_index):
+				min_distance = curr_distance
+				min_index = self.first_indices[candidate]
+				max_edits = int(math.floor(min_distance / float(cheapest) + 1e-9))
+		return select_closest_word(dictionary, min_distance, min_index, first_distance)
@@ -0,0 +1,251 @@
+import sys, os, time
+import json
+import traceback
+import threading
+import Queue
+import collections
+import multiprocessing
+import BaseHTTPServer
+import SocketServer
+import urlparse
+import spellcheck
+
+
+def main():
+	options = parse_server_options(sys.argv[2:])
+	if len(sys.argv) < 2 or options == None:
+		print "Command should follow format: python spellserver.py 3esl.txt [--port <port>] [--batch-window <milliseconds>] [--max-batch <numberOfWords>] [spellcheck.py options]"
+		sys.exit(1)
+	dictionaryFileName = sys.argv[1]
+
+	# Load the dictionary and build the index once, then keep them in memory for every request
+	service = SpellService(dictionaryFileName, options)
+	server = SpellHTTPServer(("127.0.0.1", options["port"]), SpellRequestHandler)
+	server.service = service
+	print "serving corrections on http://127.0.0.1:%d (GET /correct?word=..., POST /correct, GET /stats)" % server.server_address[1]
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	server.server_close()
+	service.close()
+	print json.dumps(service.stats(), indent=2)
+
+
+############ Helper functions used in spellserver.py ############
+# Function that reads the server's own flags, and passes the rest on to spellcheck.parse_options
+# Returns None if a flag isn't recognized (or is missing its value) so main can print the usage message
+def parse_server_options(args):
+	server_options = {"port": 8349, "batch_window": 0.002, "max_batch": 256}
+	other_args = []
+	i = 0
+	while i < len(args):
+		if args[i] == "--port" and i + 1 < len(args) and args[i+1].isdigit():
+			server_options["port"] = int(args[i+1])
+			i += 1
+		elif args[i] == "--batch-window" and i + 1 < len(args) and args[i+1].isdigit():
+			server_options["batch_window"] = int(args[i+1]) / 1000.0
+			i += 1
+		elif args[i] == "--max-batch" and i + 1 < len(args) and args[i+1].isdigit() and int(args[i+1]) > 0:
+			server_options["max_batch"] = int(args[i+1])
+			i += 1
+		else:
+			other_args.append(args[i])
+		i += 1
+	options = spellcheck.parse_options(other_args)
+	if options == None:
+		return None
+	options.update(server_options)
+	return options
+
+#### Class that keeps the dictionary, index and correction cache resident and corrects words in batches
+# Requests from the HTTP handler threads go on a queue. A single batching thread waits for the first request, gathers any others that
+# arrive within batch_window seconds (up to max_batch words), and corrects every distinct word in the batch, either itself
+# or, with more than one worker, by splitting the words across a pool of processes that each hold their own copy of the index
+# What a batch saves is the repeated words (and the hand-off to the workers); each distinct word is still looked up on its own.
+# Looking several words up in one NumPy pass over VectorDictionary's buckets was tried, and was 10-15% slower than one word at a
+# time: a bucket holds thousands of words, so each lookup is already dominated by array work rather than per-call overhead
+# With workers, the dictionary, index and cache only exist in the worker processes, and each worker reports its cache counters
+# with every chunk it corrects, so stats() can add them up
+class SpellService:
+	def __init__(self, dictionaryFileName, options):
+		self.dictionary = None
+		self.index = None
+		self.cache = None
+		self.pool = None
+		self.worker_cache_stats = {} # worker process id -> its latest cache counters
+		self.workers = options["workers"]
+		if self.workers > 1:
+			self.pool = multiprocessing.Pool(self.workers, spellcheck.init_spell_check_worker, (dictionaryFileName, options))
+		else:
+			self.dictionary = spellcheck.read_dictionary(dictionaryFileName)
+			self.index = spellcheck.build_index(options, self.dictionary)
+			self.cache = spellcheck.build_cache(options, self.dictionary)
+		self.batch_window = options["batch_window"]
+		self.max_batch = options["max_batch"]
+		self.requests = Queue.Queue()
+		self.latencies = collections.deque(maxlen=10000) # seconds taken by the most recent requests
+		self.lock = threading.Lock()
+		self.request_count = 0
+		self.word_count = 0
+		self.batch_count = 0
+		batcher = threading.Thread(target=self.run_batches)
+		batcher.daemon = True
+		batcher.start()
+
+	# Function called by a handler thread to correct a list of words. Blocks until the batch holding them has been corrected
+	def correct(self, words):
+		request = {"words": words, "corrections": None, "done": threading.Event()}
+		self.requests.put(request)
+		request["done"].wait()
+		return request["corrections"]
+
+	# Function that records how long a request took, for the latency percentiles
+	def record_latency(self, seconds, words):
+		with self.lock:
+			self.latencies.append(seconds)
+			self.request_count += 1
+			self.word_count += words
+
+	def run_batches(self):
+		while True:
+			batch = [self.requests.get()]
+			batch_words = len(batch[0]["words"])
+			deadline = time.time() + self.batch_window
+			while batch_words < self.max_batch:
+				remaining = deadline - time.time()
+				if remaining <= 0:
+					break
+				try:
+					request = self.requests.get(timeout=remaining)
+				except Queue.Empty:
+					break
+				batch.append(request)
+				batch_words += len(request["words"])
+			self.correct_batch(batch)
+
+	def correct_batch(self, batch):
+		try:
+			# The same word often appears in several requests of a batch, so each distinct word is only corrected once
+			words = sorted(set([word for request in batch for word in request["words"]]))
+			if self.pool != None:
+				chunk_size = max((len(words) + self.workers - 1) // self.workers, 1)
+				chunks = [words[i:i + chunk_size] for i in range(0, len(words), chunk_size)]
+				corrected = []
+				for pid, chunk_corrections, cache_stats in self.pool.map(correct_worker_words, chunks):
+					corrected.extend(chunk_corrections)
+					if cache_stats != None:
+						with self.lock:
+							self.worker_cache_stats[pid] = cache_stats
+			else:
+				corrected = [spellcheck.correct_word(word, self.dictionary, self.index, self.cache) for word in words]
+			corrections = dict(zip(words, corrected))
+			for request in batch:
+				request["corrections"] = [corrections[word] for word in request["words"]]
+			with self.lock:
+				self.batch_count += 1
+		except Exception:
+			# Log the error and keep the batching thread running, otherwise every later request would wait forever
+			traceback.print_exc()
+		finally:
+			# Wake every waiting request up, even if correcting failed (its corrections are then left as None)
+			for request in batch:
+				request["done"].set()
+
+	def stats(self):
+		with self.lock:
+			latencies = list(self.latencies)
+			stats = {"requests": self.request_count, "words": self.word_count, "batches": self.batch_count,
+					 "latency_ms": {"p50": 1000 * spellcheck.latency_percentile(latencies, 0.5),
+									"p99": 1000 * spellcheck.latency_percentile(latencies, 0.99),
+									"max": 1000 * max(latencies or [0])}}
+			worker_cache_stats = self.worker_cache_stats.values()
+		if self.cache != None:
+			stats["cache"] = self.cache.stats()
+		elif len(worker_cache_stats) > 0:
+			stats["cache"] = combine_cache_stats(worker_cache_stats)
+		return stats
+
+	def close(self):
+		if self.pool != None:
+			self.pool.close()
+			self.pool.join()
+
+# Function run by a worker process to correct a chunk of a batch, using the dictionary, index and cache set up by spellcheck.init_spell_check_worker
+# Returns the process id, the corrections, and the worker's cache counters (None if the cache is off)
+def correct_worker_words(words):
+	corrections = [spellcheck.correct_word(word, spellcheck.worker_dictionary, spellcheck.worker_index, spellcheck.worker_cache) for word in words]
+	cache_stats = None
+	if spellcheck.worker_cache != None:
+		cache_stats = spellcheck.worker_cache.stats()
+	return os.getpid(), corrections, cache_stats
+
+# Function that adds up the cache counters of the worker processes (see CorrectionCache.stats), as if they were one cache
+def combine_cache_stats(cache_stats):
+	combined = {}
+	for key in ["exact_hits", "hits", "misses", "evictions", "size", "maxsize"]:
+		combined[key] = sum([stats[key] for stats in cache_stats])
+	lookups = combined["exact_hits"] + combined["hits"] + combined["misses"]
+	combined["hit_rate"] = float(combined["exact_hits"] + combined["hits"]) / max(lookups, 1)
+	combined["workers"] = len(cache_stats)
+	return combined
+
+# Function that decodes a word from a request (or its correction) so it can be put in a JSON response
+# Words are corrected as the bytes they were sent as, but JSON needs text: UTF-8 is used if the bytes are valid UTF-8,
+# and otherwise latin-1, which can decode any bytes, so a word in another encoding still gets a response
+def decode_word(word):
+	try:
+		return word.decode("utf-8")
+	except UnicodeDecodeError:
+		return word.decode("latin-1")
+
+#### HTTP server that handles each request on its own thread, so concurrent requests can end up in the same batch
+class SpellHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	daemon_threads = True
+
+#### Request handler for the endpoints:
+#  GET /correct?word=teh&word=wrld    corrections for the given words
+#  POST /correct                      corrections for the words in the body, one per line
+#  GET /stats                         request counts, batch counts, latency percentiles and cache counters
+# Corrections are returned as JSON: {"corrections": ["the", "world"]}
+class SpellRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	def do_GET(self):
+		url = urlparse.urlparse(self.path)
+		if url.path == "/correct":
+			self.respond_corrections(urlparse.parse_qs(url.query).get("word", []))
+		elif url.path == "/stats":
+			self.send_json(200, self.server.service.stats())
+		else:
+			self.send_json(404, {"error": "unknown path %s" % decode_word(url.path)})
+
+	def do_POST(self):
+		if urlparse.urlparse(self.path).path != "/correct":
+			self.send_json(404, {"error": "unknown path %s" % decode_word(self.path)})
+			return
+		body = self.rfile.read(int(self.headers.getheader("content-length", 0)))
+		self.respond_corrections([word for word in body.splitlines() if word != ""])
+
+	def respond_corrections(self, words):
+		start = time.time()
+		corrections = self.server.service.correct(words)
+		if corrections == None:
+			self.send_json(500, {"error": "correction failed"})
+			return
+		self.send_json(200, {"corrections": [decode_word(word) for word in corrections]})
+		self.server.service.record_latency(time.time() - start, len(words))
+
+	def send_json(self, status, payload):
+		body = json.dumps(payload)
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	# Don't log every request to stderr
+	def log_message(self, format, *args):
+		pass
+
+
+if __name__ == "__main__":
+	main()